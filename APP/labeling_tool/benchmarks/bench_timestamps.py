@@ -0,0 +1,65 @@
+"""
+Timestamp parsing benchmark: pandas to_datetime vs core.timestamp_parser
+
+Builds a synthetic multi-hour 50Hz session of 'yyyy/MM/dd HH:mm:ss.SSS' strings
+(the Android CSVManager layout), parses it both ways and checks the results match.
+
+Usage:
+    python benchmarks/bench_timestamps.py --hours 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.timestamp_parser import TIMESTAMP_FORMAT, parse_android_timestamps  # noqa: E402
+
+
+def synthetic_timestamps(hours: float, seed: int = 0) -> np.ndarray:
+    """50Hz timestamps with BLE jitter, formatted like the Android app (object array of str)."""
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * 50)
+    start = np.datetime64('2025-12-05T22:20:06.510', 'ms')
+    steps = np.maximum(rng.normal(20, 3, n), 1).astype(np.int64)
+    stamps = start + np.cumsum(steps).astype('timedelta64[ms]')
+    iso = np.datetime_as_string(stamps, unit='ms')  # 2025-12-05T22:20:06.530
+    iso = np.char.replace(np.char.replace(iso, '-', '/'), 'T', ' ')
+    return iso.astype(object)
+
+
+def best_of(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=4, help="Session length to simulate")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per parser (best is reported)")
+    args = parser.parse_args()
+
+    values = synthetic_timestamps(args.hours)
+    print(f"{len(values):,} timestamps ({args.hours:g} h @ 50Hz)")
+
+    t_pandas, ref = best_of(
+        lambda: pd.to_datetime(pd.Series(values), format=TIMESTAMP_FORMAT).to_numpy('datetime64[ms]'),
+        args.repeat)
+    t_fast, fast = best_of(lambda: parse_android_timestamps(values), args.repeat)
+
+    assert np.array_equal(ref, fast), "parsers disagree"
+    print(f"pandas to_datetime : {t_pandas * 1000:8.1f} ms  ({t_pandas / len(values) * 1e9:6.1f} ns/row)")
+    print(f"numpy fixed-width  : {t_fast * 1000:8.1f} ms  ({t_fast / len(values) * 1e9:6.1f} ns/row)")
+    print(f"speedup            : {t_pandas / t_fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,9 @@ if exist "dist" rmdir /s /q "dist"
 :: --windowed: No console window (GUI only)
 :: --noconfirm: Do not ask for confirmation to overwrite
 :: --clean: Clean cache
+:: --paths: server\inference.py (model backends shared with the server, see core\prelabel.py)
 echo Running PyInstaller...
-python -m PyInstaller --noconfirm --onedir --windowed --clean --name "SmartRacketLabeler" main.py
+python -m PyInstaller --noconfirm --onedir --windowed --clean --paths "..\..\server" --name "SmartRacketLabeler" main.py
 
 if %errorlevel% neq 0 (
     echo Build Failed!
@@ -3,6 +3,15 @@ import numpy as np
 from datetime import datetime
 import glob
 import os
+import shutil
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core.frame_cache import FrameCache
+from core.session import Session
+from core.pyramid import MinMaxPyramid
+from core.timestamp_parser import parse_android_timestamps
+from core.resampler import resample_linear
 
 class CSVReader:
     """
@@ -12,52 +21,113 @@ class CSVReader:
     
     # Expected columns from Android APP
     REQUIRED_COLUMNS = ['timestamp', 'accelX', 'accelY', 'accelZ', 'gyroX', 'gyroY', 'gyroZ']
+    NUMERIC_COLUMNS = ['accelX', 'accelY', 'accelZ', 'gyroX', 'gyroY', 'gyroZ']
     
     # Target Sampling Rate
     TARGET_FREQ_HZ = 50
     TARGET_dt_MS = 20  # 1000ms / 50Hz = 20ms
     
-    def __init__(self):
-        self._df_raw = None      # Combined raw dataframe
-        self._df_resampled = None # Resampled 50Hz dataframe
+    # Inputs larger than this (total CSV bytes) are loaded in streaming mode
+    STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+    
+    def __init__(self, cache_dir="cache", max_gap_ms=None, streaming=None, chunk_rows=500_000):
+        """
+        max_gap_ms: raw gaps longer than this are left as NaN (invalid) in the
+            50Hz grid instead of being interpolated across. None = always interpolate.
+        streaming: read + resample chunk by chunk straight into a memory-mapped
+            frame store, so memory stays flat however long the session is.
+            None = only when the input is larger than STREAMING_THRESHOLD_BYTES.
+        chunk_rows: raw CSV rows per chunk in streaming mode
+        """
+        self._raw_t = None       # Sorted unique raw timestamps (epoch ms, int64)
+        self._raw_values = None  # Raw channels (N, 6) float32
+        self._frames = None      # Resampled (N, 8) float32, see FrameCache.COLUMNS
+        self._session = None     # Session over _frames once loaded
+        self._df_resampled = None # Resampled 50Hz dataframe (built on first get_data())
         self._is_loaded = False
+        self._start_ms = None    # Start time (epoch ms, naive local time)
+        self._dt_ms = self.TARGET_dt_MS
+        self._gap_count = 0
+        self.max_gap_ms = max_gap_ms
+        self.streaming = streaming
+        self.chunk_rows = chunk_rows
+        self._cache = FrameCache(cache_dir) if cache_dir else None
         
-    def load_files(self, file_paths: list[str]) -> bool:
+    def load_files(self, file_paths: list[str], progress=None, workers=None) -> bool:
         """
         Load multiple CSV files, merge, sort, and process them.
+        Files are parsed concurrently (one task per file, `workers` threads,
+        default one per CPU core); progress(done, total, path) is called from the
+        calling thread after each file, so it is safe to update the GUI from it.
+        Processed frames are cached (see FrameCache), so re-opening the
+        same files only memory-maps the cached result.
+        Large inputs are loaded in streaming mode (see _load_streaming).
         Returns True if successful.
         """
         try:
-            df_list = []
-            
+            existing = []
             for fpath in file_paths:
                 if not os.path.exists(fpath):
                     print(f"File not found: {fpath}")
                     continue
+                existing.append(fpath)
+            
+            key = self._cache.key_for(existing, {"max_gap_ms": self.max_gap_ms}) if self._cache and existing else None
+            cached = self._cache.load(key) if key else None
+            if cached is not None:
+                print(f"Loaded {len(existing)} files from cache")
+                self._set_frames(*cached, cache=self._cache, key=key)
+                self._is_loaded = True
+                return True
+            
+            streaming = self.streaming
+            if streaming is None:
+                streaming = sum(os.path.getsize(p) for p in existing) > self.STREAMING_THRESHOLD_BYTES
+            if streaming:
+                self._is_loaded = self._load_streaming(existing, key, progress)
+                return self._is_loaded
+            
+            # Read + parse each file independently
+            parts = {}
+            workers = workers or min(len(existing), os.cpu_count() or 1) or 1
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(self._read_file, fpath): fpath for fpath in existing}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    fpath = futures[future]
+                    part = future.result()
+                    if part is not None:
+                        parts[fpath] = part
+                    if progress:
+                        progress(done, len(existing), fpath)
                 
-                # Read CSV
-                # Format: timestamp,receivedAt,accelX,accelY,accelZ,gyroX,gyroY,gyroZ
-                # timestamp example: 2025/12/05 22:20:06.510
-                df = pd.read_csv(fpath)
-                
-                # Check columns
-                if not all(col in df.columns for col in self.REQUIRED_COLUMNS):
-                    print(f"Skipping {fpath}: Missing required columns")
-                    continue
-                    
-                df_list.append(df)
-                
-            if not df_list:
+            if not parts:
                 print("No valid CSV files loaded.")
                 return False
                 
-            # Merge
-            self._df_raw = pd.concat(df_list, ignore_index=True)
-            
             # Processing
-            self._process_raw_data()
+            self._process_raw_data(list(parts.values()))
             self._resample_data()
             
+            frames = self._frames
+            meta = {
+                "start_ms": int(self._raw_t[0]),
+                "dt_ms": self.TARGET_dt_MS,
+                "raw_count": self._raw_count,
+                "expected_count": self._expected_count,
+                "gap_count": self._gap_count,
+                "sources": [os.path.abspath(p) for p in existing],
+            }
+            # Raw samples are no longer needed once resampled
+            self._raw_t = self._raw_values = None
+            
+            cache = None
+            if key and self._cache.save(key, frames, meta):
+                cached = self._cache.load(key)
+                if cached is not None:
+                    frames, meta = cached
+                    cache = self._cache
+            self._set_frames(frames, meta, cache=cache, key=key)
+            
             self._is_loaded = True
             return True
             
@@ -65,81 +135,231 @@ class CSVReader:
             print(f"Error loading CSVs: {e}")
             return False
 
-    def _process_raw_data(self):
+    def _read_file(self, fpath: str):
         """
-        Parse timestamps and sort raw data.
+        Parse one CSV into sorted, deduplicated (t_ms int64, values (N, 6) float32).
+        Runs in a worker thread; returns None if the file can't be used.
         """
-        # Parse 'timestamp' column to datetime objects
-        # Format is 'yyyy/MM/dd HH:mm:ss.SSS'
-        # pandas to_datetime is smart, but specifying format is safer/faster if consistent
-        self._df_raw['datetime'] = pd.to_datetime(self._df_raw['timestamp'], format='%Y/%m/%d %H:%M:%S.%f')
-        
-        # Sort by time
-        self._df_raw = self._df_raw.sort_values('datetime')
+        # Read CSV
+        # Format: timestamp,receivedAt,accelX,accelY,accelZ,gyroX,gyroY,gyroZ
+        # timestamp example: 2025/12/05 22:20:06.510
+        # Only the needed columns are parsed (receivedAt is skipped)
+        df = pd.read_csv(fpath, usecols=lambda col: col in self.REQUIRED_COLUMNS)
         
-        # Drop duplicates (based on timestamp)
-        self._df_raw = self._df_raw.drop_duplicates(subset=['datetime'])
+        # Check columns
+        if not all(col in df.columns for col in self.REQUIRED_COLUMNS):
+            print(f"Skipping {fpath}: Missing required columns")
+            return None
+        return self._parse_chunk(df, fpath)
+
+    def _parse_chunk(self, df: pd.DataFrame, fpath: str):
+        """Rows of one CSV (or a chunk of it) -> sorted, deduplicated (t_ms, values), or None if empty."""
+        # Parse 'timestamp' column
+        # Format is 'yyyy/MM/dd HH:mm:ss.SSS'
+        # Fixed-width layout, so it is decoded with NumPy directly (see timestamp_parser)
+        t = parse_android_timestamps(df['timestamp'].to_numpy()).view(np.int64)
+        values = df[self.NUMERIC_COLUMNS].to_numpy(dtype=np.float32)
         
-        # Reset index
-        self._df_raw = self._df_raw.reset_index(drop=True)
+        # Rows whose timestamp or values couldn't be read are dropped
+        valid = (t != np.iinfo(np.int64).min) & np.isfinite(values).all(axis=1)
+        if not valid.all():
+            print(f"{os.path.basename(fpath)}: dropping {int((~valid).sum())} unreadable rows")
+            t, values = t[valid], values[valid]
+        if len(t) == 0:
+            return None
+        return self._sort_dedup(t, values)
+
+    @staticmethod
+    def _sort_dedup(t: np.ndarray, values: np.ndarray):
+        """Sort by time (stable, so the first of any duplicates is kept) and drop duplicate timestamps."""
+        if np.any(t[1:] < t[:-1]):
+            order = np.argsort(t, kind='stable')
+            t, values = t[order], values[order]
+        keep = np.ones(len(t), dtype=bool)
+        np.not_equal(t[1:], t[:-1], out=keep[1:])
+        if keep.all():
+            return t, values
+        return t[keep], values[keep]
+
+    def _process_raw_data(self, parts: list):
+        """
+        Merge per-file (t, values) arrays into _raw_t / _raw_values.
+        The Android app splits recordings into consecutive 5-minute files, so once the
+        files are ordered by start time this is a plain concatenation; only files
+        that actually overlap trigger a full sort.
+        """
+        parts = sorted(parts, key=lambda part: part[0][0])
+        overlapping = any(cur[0][0] <= prev[0][-1] for prev, cur in zip(parts, parts[1:]))
         
-        # Convert timestamp to milliseconds (relative to start of the day or just keep as datetime)
-        # For simplicity in labeling, we often use relative milliseconds from start
-        # But here let's keep datetime as index for resampling advantage
-        self._df_raw.set_index('datetime', inplace=True)
+        t = np.concatenate([part[0] for part in parts])
+        values = np.concatenate([part[1] for part in parts])
+        if overlapping:
+            t, values = self._sort_dedup(t, values)
+        self._raw_t, self._raw_values = t, values
 
     def _resample_data(self):
         """
         Resample data to fixed 50Hz grid.
-        Interpolate missing values.
+        Linear interpolation in time (see resampler.resample_linear).
         """
-        if self._df_raw is None or self._df_raw.empty:
-            return
+        if self._raw_t is None or len(self._raw_t) == 0:
+            raise ValueError("no valid samples")
 
-        # 1. Create target time grid
-        start_time = self._df_raw.index[0]
-        end_time = self._df_raw.index[-1]
-        
         # Stats Calculation
-        self._raw_count = len(self._df_raw)
-        total_seconds = (end_time - start_time).total_seconds()
+        self._raw_count = len(self._raw_t)
+        total_seconds = (self._raw_t[-1] - self._raw_t[0]) / 1000.0
         self._expected_count = int(total_seconds * self.TARGET_FREQ_HZ) + 1
         
-        # Create DatetimeIndex with 20ms freq
-        target_index = pd.date_range(start=start_time, end=end_time, freq=f'{self.TARGET_dt_MS}ms')
-        
-        # 2. Reindex raw data to this new grid
-        combined_index = self._df_raw.index.union(target_index).sort_values()
-        df_combined = self._df_raw.reindex(combined_index)
-        
-        # 3. Interpolate (Time-based linear interpolation)
-        numeric_cols = ['accelX', 'accelY', 'accelZ', 'gyroX', 'gyroY', 'gyroZ']
-        df_combined[numeric_cols] = df_combined[numeric_cols].interpolate(method='time')
+        _, resampled, valid = resample_linear(
+            self._raw_t, self._raw_values, self.TARGET_dt_MS, max_gap_ms=self.max_gap_ms
+        )
+        self._gap_count = int(np.count_nonzero(~valid))
+        self._frames = self._to_frames(resampled)
+
+    @staticmethod
+    def _to_frames(resampled: np.ndarray) -> np.ndarray:
+        """Frame layout: 6 channels + acc/gyro magnitude"""
+        frames = np.empty((len(resampled), len(FrameCache.COLUMNS)), dtype=np.float32)
+        frames[:, :6] = resampled
+        acc, gyro = frames[:, 0:3], frames[:, 3:6]
+        np.sqrt(np.einsum('ij,ij->i', acc, acc), out=frames[:, 6])
+        np.sqrt(np.einsum('ij,ij->i', gyro, gyro), out=frames[:, 7])
+        return frames
+
+    def _order_files(self, file_paths: list[str]) -> list[str]:
+        """
+        Usable files ordered by their first timestamp (only the first row of each is read).
+        """
+        starts = {}
+        for fpath in file_paths:
+            head = pd.read_csv(fpath, usecols=lambda col: col in self.REQUIRED_COLUMNS, nrows=1)
+            if not all(col in head.columns for col in self.REQUIRED_COLUMNS):
+                print(f"Skipping {fpath}: Missing required columns")
+                continue
+            t0 = parse_android_timestamps(head['timestamp'].to_numpy()).view(np.int64)
+            # Files with an unreadable first row keep their place at the end
+            starts[fpath] = int(t0[0]) if len(t0) and t0[0] != np.iinfo(np.int64).min else np.iinfo(np.int64).max
+        return sorted(starts, key=starts.get)
+
+    def _load_streaming(self, file_paths: list[str], key, progress=None) -> bool:
+        """
+        Read and resample the files chunk by chunk (chunk_rows raw rows at a time,
+        files in time order), appending the 50Hz frames to a FrameCache entry that
+        is then memory-mapped. Only one chunk of raw rows and its frames are in memory.
         
-        # 4. Select only the target grid points
-        self._df_resampled = df_combined.reindex(target_index)
+        The last raw sample of each chunk is carried over into the next one, and the
+        grid continues where the previous chunk stopped, so the output is the same as
+        resampling everything at once. Assumes the recording is time-ordered across
+        chunks (as the Android app writes it): rows not newer than the carried-over
+        sample are dropped instead of being merged back in.
+        """
+        cache = self._cache
+        try:
+            writer = cache.writer(key) if key else None
+        except OSError as e:
+            print(f"Frame cache not available ({e}), using a temporary store")
+            writer = None
+        if writer is None:
+            # No (usable) cache folder: the frames still need a file to be memory-mapped from
+            tmp_dir = tempfile.mkdtemp(prefix="imu_frames_")
+            weakref.finalize(self, shutil.rmtree, tmp_dir, ignore_errors=True)
+            cache = FrameCache(tmp_dir)
+            key = cache.key_for(file_paths, {"max_gap_ms": self.max_gap_ms})
+            writer = cache.writer(key)
         
-        # 5. Handle any remaining NaNs
-        self._df_resampled[numeric_cols] = self._df_resampled[numeric_cols].ffill().bfill()
+        dt_ms = self.TARGET_dt_MS
+        carry = None           # Last raw (t, values) of the previous chunk
+        next_grid = None       # First grid point the next chunk has to produce
+        start_ms = None
+        raw_count = gap_count = 0
+        try:
+            files = self._order_files(file_paths)
+            for done, fpath in enumerate(files, start=1):
+                chunks = pd.read_csv(fpath, usecols=lambda col: col in self.REQUIRED_COLUMNS, chunksize=self.chunk_rows)
+                for df in chunks:
+                    part = self._parse_chunk(df, fpath)
+                    if part is None:
+                        continue
+                    t, values = part
+                    if carry is None:
+                        start_ms = next_grid = int(t[0])
+                    else:
+                        newer = t > carry[0][0]
+                        if not newer.all():
+                            t, values = t[newer], values[newer]
+                        if len(t) == 0:
+                            continue
+                        t = np.concatenate([carry[0], t])
+                        values = np.concatenate([carry[1], values])
+                    raw_count += len(t) - (carry is not None)
+                    
+                    grid, resampled, valid = resample_linear(
+                        t, values, dt_ms, max_gap_ms=self.max_gap_ms, grid_start=next_grid
+                    )
+                    if len(grid):
+                        writer.append(self._to_frames(resampled))
+                        gap_count += int(np.count_nonzero(~valid))
+                        next_grid = int(grid[-1]) + dt_ms
+                    carry = (t[-1:], values[-1:])
+                if progress:
+                    progress(done, len(files), fpath)
+        except BaseException:
+            writer.abort()
+            raise
         
-        # 6. Add convenience columns
-        self._df_resampled['t_ms'] = (self._df_resampled.index - start_time).total_seconds() * 1000
+        if carry is None:
+            writer.abort()
+            print("No valid CSV files loaded.")
+            return False
         
-        # Calculate Magnitude
-        self._df_resampled['acc_mag'] = np.sqrt(
-            self._df_resampled['accelX']**2 + 
-            self._df_resampled['accelY']**2 + 
-            self._df_resampled['accelZ']**2
-        )
-        self._df_resampled['gyro_mag'] = np.sqrt(
-            self._df_resampled['gyroX']**2 + 
-            self._df_resampled['gyroY']**2 + 
-            self._df_resampled['gyroZ']**2
-        )
+        total_seconds = (int(carry[0][0]) - start_ms) / 1000.0
+        meta = {
+            "start_ms": start_ms,
+            "dt_ms": dt_ms,
+            "raw_count": raw_count,
+            "expected_count": int(total_seconds * self.TARGET_FREQ_HZ) + 1,
+            "gap_count": gap_count,
+            "sources": [os.path.abspath(p) for p in file_paths],
+        }
+        writer.commit(meta)
+        # If commit lost a race with another instance, that instance's entry is identical
+        cached = cache.load(key)
+        if cached is None:
+            print("Error loading CSVs: streamed frames could not be memory-mapped")
+            return False
+        self._set_frames(*cached, cache=cache, key=key)
+        return True
+
+    def _set_frames(self, frames: np.ndarray, meta: dict, cache: FrameCache = None, key: str = None):
+        """
+        Take the (N, 8) frame array (possibly a read-only memmap) as the loaded session.
+        Its drawing pyramid is built here, and stored with / read from the cache entry if given.
+        """
+        self._start_ms = int(meta["start_ms"])
+        self._dt_ms = meta.get("dt_ms", self.TARGET_dt_MS)
+        self._raw_count = meta["raw_count"]
+        self._expected_count = meta["expected_count"]
+        self._gap_count = meta.get("gap_count", 0)
+        self._frames = frames
+        self._session = Session(frames, self._start_ms, self._dt_ms, self._load_pyramid(frames, cache, key))
+        self._df_resampled = None
+
+    @staticmethod
+    def _load_pyramid(frames: np.ndarray, cache: FrameCache = None, key: str = None) -> MinMaxPyramid:
+        if cache is None or key is None:
+            return MinMaxPyramid(frames)
+        names = [f"minmax_{bucket}" for bucket in MinMaxPyramid.bucket_sizes(len(frames))]
+        levels = [cache.load_array(key, name) for name in names]
+        if all(level is not None for level in levels):
+            return MinMaxPyramid(frames, levels)
+        pyramid = MinMaxPyramid(frames)
+        for name, level in zip(names, pyramid.levels):
+            cache.save_array(key, name, level)
+        return pyramid
 
     def get_stats(self) -> dict:
         """Returns statistics aboutloaded data"""
-        if self._df_resampled is None:
+        if self._frames is None:
             return {}
             
         duration_sec = self.get_duration_ms() / 1000.0
@@ -153,39 +373,74 @@ class CSVReader:
         
         return {
             "duration_str": str(pd.Timedelta(seconds=duration_sec)).split('.')[0], # HH:MM:SS
-            "total_samples": len(self._df_resampled),
+            "total_samples": len(self._frames),
             "expected_samples": self._expected_count,
             "raw_samples": self._raw_count,
+            "gap_samples": self._gap_count,
             "missing_ratio": missing_ratio
         }
 
+    def get_cached_sessions(self) -> list:
+        """(start_ms, cache key) of every session in the frame cache (only metadata is read)"""
+        if self._cache is None:
+            return []
+        return [(int(meta["start_ms"]), key) for key, meta in self._cache.entries()]
+
+    def open_cached_session(self, key: str) -> Session:
+        """A session from the frame cache (memory-mapped, the current one is untouched), or None"""
+        cached = self._cache.load(key) if self._cache else None
+        if cached is None:
+            return None
+        frames, meta = cached
+        return Session(frames, meta["start_ms"], meta.get("dt_ms", self.TARGET_dt_MS))
+
+    def get_session(self) -> Session:
+        """
+        Returns the loaded data as a Session: the (N, 8) float32 frames plus
+        start time and grid step. Preferred over the DataFrame getters.
+        """
+        return self._session
+
     def get_data(self) -> pd.DataFrame:
         """
-        Returns the processed, 50Hz resampled dataframe.
+        Returns the processed, 50Hz resampled dataframe (whole session).
+        For long sessions prefer get_session() or get_range(), which only touch the requested rows.
         """
+        if self._df_resampled is None and self._session is not None:
+            self._df_resampled = self._session.to_dataframe()
         return self._df_resampled
 
+    def get_range(self, t0_ms: float, t1_ms: float) -> pd.DataFrame:
+        """
+        Returns the 50Hz frames with t0_ms <= t_ms < t1_ms (ms relative to the
+        session start, like the t_ms column), same columns as get_data().
+        The frames are a view on the (memory-mapped) store, only this window is read.
+        """
+        if self._session is None:
+            return None
+        return self._session.to_dataframe(*self._session.range(t0_ms, t1_ms))
+
     def get_duration_ms(self) -> float:
-        if self._df_resampled is not None:
-            return self._df_resampled['t_ms'].iloc[-1]
+        if self._session is not None:
+            return self._session.duration_ms
         return 0.0
 
     def get_start_timestamp_str(self) -> str:
-        if self._df_raw is not None and not self._df_raw.empty:
+        if self._start_ms is not None:
             # Use original raw start time
-            return self._df_raw.index[0].strftime('%Y/%m/%d %H:%M:%S.%f')[:-3]
+            return pd.Timestamp(self._start_ms, unit='ms').strftime('%Y/%m/%d %H:%M:%S.%f')[:-3]
         return ""
         
     def get_start_timestamp_unix(self) -> float:
         """Returns start unix timestamp in milliseconds"""
-        if self._df_raw is not None and not self._df_raw.empty:
-            return self._df_raw.index[0].timestamp() * 1000
+        if self._start_ms is not None:
+            return float(self._start_ms)
         return 0.0
 
     def get_start_datetime(self) -> datetime:
         """Returns start datetime object (Naive)"""
-        if self._df_raw is not None and not self._df_raw.empty:
-            return self._df_raw.index[0].to_pydatetime()
+        if self._session is not None:
+            return self._session.start_datetime
         return datetime.min
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+
+class FrameCache:
+    """
+    Persistent cache of processed (50Hz resampled) IMU frames.
+
+    Layout: <root>/<key>/
+        meta.json   - start time, grid step, row count, stats, source files
+        frames.f32  - (rows, len(COLUMNS)) little-endian float32, row-major, no header,
+                      opened as a read-only np.memmap
+        <name>.npy  - derived arrays stored next to the frames (e.g. the drawing
+                      pyramid), see save_array / load_array
+
+    The raw layout can be appended chunk by chunk (see FrameWriter), so sessions
+    larger than RAM are written without ever holding all frames in memory.
+
+    The key is derived from the source CSV paths, mtimes and sizes, so editing
+    or replacing a CSV automatically produces a new entry (stale entries are
+    never overwritten, only orphaned).
+    """
+
+    VERSION = 2
+    COLUMNS = ['accelX', 'accelY', 'accelZ', 'gyroX', 'gyroY', 'gyroZ', 'acc_mag', 'gyro_mag']
+    DTYPE = np.dtype('<f4')
+
+    def __init__(self, root="cache"):
+        self.root = root
+
+    def key_for(self, file_paths: list[str], params: dict = None) -> str:
+        """params: processing options that change the output (e.g. gap handling)"""
+        h = hashlib.sha1(f"v{self.VERSION}|{json.dumps(params or {}, sort_keys=True)}".encode())
+        for path in sorted(os.path.abspath(p) for p in file_paths):
+            st = os.stat(path)
+            h.update(f"|{path}|{st.st_mtime_ns}|{st.st_size}".encode())
+        return h.hexdigest()
+
+    def load(self, key: str):
+        """Returns (frames memmap, meta dict) or None on a cache miss."""
+        entry = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(entry, "meta.json"), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") != self.VERSION:
+                return None
+            shape = (int(meta["rows"]), len(self.COLUMNS))
+            path = os.path.join(entry, "frames.f32")
+            if os.path.getsize(path) != shape[0] * shape[1] * self.DTYPE.itemsize:
+                return None
+            if shape[0] == 0:
+                return np.empty(shape, dtype=self.DTYPE), meta
+            frames = np.memmap(path, dtype=self.DTYPE, mode='r', shape=shape)
+        except (OSError, ValueError, KeyError):
+            return None
+        return frames, meta
+
+    def entries(self):
+        """Yields (key, meta) of every complete entry"""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for key in names:
+            try:
+                with open(os.path.join(self.root, key, "meta.json"), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if meta.get("version") == self.VERSION:
+                yield key, meta
+
+    def load_array(self, key: str, name: str):
+        """Derived array stored with an entry (memory-mapped), or None"""
+        try:
+            return np.load(os.path.join(self.root, key, f"{name}.npy"), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def save_array(self, key: str, name: str, array: np.ndarray) -> bool:
+        path = os.path.join(self.root, key, f"{name}.npy")
+        tmp = f"{path}.tmp-{os.getpid()}.npy"
+        try:
+            np.save(tmp, array)
+            os.replace(tmp, path)
+            return True
+        except OSError as e:
+            print(f"Frame cache not written ({e})")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+
+    def writer(self, key: str) -> "FrameWriter":
+        return FrameWriter(os.path.join(self.root, key))
+
+    def save(self, key: str, frames: np.ndarray, meta: dict) -> bool:
+        writer = self.writer(key)
+        try:
+            writer.append(frames)
+        except OSError as e:
+            writer.abort()
+            print(f"Frame cache not written ({e})")
+            return False
+        return writer.commit(meta)
+
+
+class FrameWriter:
+    """
+    Appends frame chunks to a new cache entry. Everything goes into a temp dir
+    that is renamed into place by commit(), so a crash mid-write never leaves a
+    half-written entry behind.
+    """
+
+    def __init__(self, entry: str):
+        self.entry = entry
+        self.rows = 0
+        self._tmp = f"{entry}.tmp-{os.getpid()}"
+        os.makedirs(self._tmp, exist_ok=True)
+        self._file = open(os.path.join(self._tmp, "frames.f32"), 'wb')
+
+    def append(self, frames: np.ndarray):
+        frames = np.ascontiguousarray(frames, dtype=FrameCache.DTYPE)
+        if frames.ndim != 2 or frames.shape[1] != len(FrameCache.COLUMNS):
+            raise ValueError(f"expected (N, {len(FrameCache.COLUMNS)}) frames, got {frames.shape}")
+        frames.tofile(self._file)
+        self.rows += len(frames)
+
+    def commit(self, meta: dict) -> bool:
+        try:
+            self._file.close()
+            with open(os.path.join(self._tmp, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump(dict(meta, version=FrameCache.VERSION, rows=self.rows), f, indent=2)
+            os.replace(self._tmp, self.entry)
+            return True
+        except OSError as e:
+            # Read-only folder or another instance won the race: just skip caching
+            print(f"Frame cache not written ({e})")
+            self.abort()
+            return False
+
+    def abort(self):
+        self._file.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
@@ -1,13 +1,17 @@
 import os
+import re
 import json
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from core.constants import LabelType
+from core.label_store import LabelStore
+from core.materializer import materialize_windows, save_npz
 
 class LabelManager:
     """
-    Handles data slicing and saving labels to JSONL.
+    Handles data slicing and saving labels.
+    Labels go to a per-session binary log (see LabelStore); JSONL is an explicit export.
     Window Size: 80 frames (60 past + current + 19 future) @ 50Hz
     """
     
@@ -15,14 +19,21 @@ class LabelManager:
     PRE_WINDOW = 30
     POST_WINDOW = 9
     
-    def __init__(self, output_dir="labels"):
+    def __init__(self, output_dir="labels", store_windows=True):
+        """
+        store_windows: keep a copy of each label's data window in the label log.
+            False = reference-only labels (time, label, sync params); windows of
+            any size are materialized from the session on export.
+        """
         self.output_dir = output_dir
+        self.store_windows = store_windows
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
             
         self._current_session_id = "default_session"
         self._csv_reader = None # Ref to CSV reader for data
         self._sync_manager = None # Ref for full sync details
+        self._store = None # LabelStore of the current session (opened on first label)
         
     def set_window_size(self, pre, post):
         self.PRE_WINDOW = pre
@@ -42,34 +53,71 @@ class LabelManager:
             self._current_session_id = clean_str if clean_str else "unknown_session"
         else:
             self._current_session_id = session_id
+        
+        if self._store is not None:
+            self._store.close()
+            self._store = None
             
+    @staticmethod
+    def session_id_for(start_ms) -> str:
+        """Session ID of a recording starting at start_ms (same as set_context: yyyyMMdd_HHmmss)"""
+        return pd.Timestamp(start_ms, unit='ms').strftime('%Y%m%d_%H%M%S')
+        
+    # Exports get their own name so they never overwrite a legacy {session_id}.jsonl
+    EXPORT_SUFFIX = "_export"
+        
     def get_output_path(self):
+        """Label log of the current session"""
+        return os.path.join(self.output_dir, f"{self._current_session_id}.labels")
+        
+    def get_legacy_path(self):
+        """Labels of the current session as saved by earlier versions (JSONL, written as you go)"""
         return os.path.join(self.output_dir, f"{self._current_session_id}.jsonl")
         
+    def get_export_path(self):
+        return os.path.join(self.output_dir, f"{self._current_session_id}{self.EXPORT_SUFFIX}.jsonl")
+        
+    def _get_store(self) -> LabelStore:
+        if self._store is None:
+            path = self.get_output_path()
+            legacy = self.get_legacy_path()
+            if not os.path.exists(path) and os.path.exists(legacy):
+                # First time this session is opened since the switch to the binary log
+                count = LabelStore.import_jsonl(legacy, path)
+                print(f"Imported {count} labels from {os.path.basename(legacy)} (the file is kept as is)")
+            self._store = LabelStore(path)
+        return self._store
+        
+    def has_labels(self) -> bool:
+        """Whether the current session already has labels (label log or legacy JSONL)"""
+        return os.path.exists(self.get_output_path()) or os.path.exists(self.get_legacy_path())
+        
+    def current_labels(self) -> list:
+        """Live labels of the current session as (t_csv_ms, label_id), importing a legacy JSONL first"""
+        return self._get_store().labels() if self.has_labels() else []
+        
     def save_label(self, label_type: int, t_csv_ms: float) -> bool:
         """
-        Slice data at t_csv_ms and append to JSONL.
+        Slice the data window at t_csv_ms and append one label record to the
+        session's binary label log (see LabelStore).
         """
         if self._csv_reader is None:
             print("Error: No CSV loaded")
             return False
             
-        df = self._csv_reader.get_data()
-        if df is None or df.empty:
+        session = self._csv_reader.get_session()
+        if session is None or len(session) == 0:
             return False
+        n = len(session)
             
         # 1. Find nearest index
         # t_csv_ms is current cursor time
-        # df is indexed by datetime, but has 't_ms' column
-        # Find row closest to t_csv_ms
-        # Faster way: t_ms is regular grid? Yes, 20ms.
-        # So index = t_csv_ms / 20. But better to use searchsorted for robustness.
-        
-        # Using searchsorted on t_ms column
-        idx = df['t_ms'].searchsorted(t_csv_ms)
+        # t_ms is a regular grid (20ms), so the first frame at/after
+        # t_csv_ms is just ceil(t_csv_ms / 20)
+        idx = session.index_at(t_csv_ms)
         
-        if idx >= len(df):
-            idx = len(df) - 1
+        if idx >= n:
+            idx = n - 1
             
         # Check if t_ms at idx is close enough? (Validation)
         # Assuming grid is dense, just perform windowing around idx
@@ -77,36 +125,30 @@ class LabelManager:
         start_idx = idx - self.PRE_WINDOW
         end_idx = idx + self.POST_WINDOW + 1 # Slice is exclusive at end
         
-        if start_idx < 0 or end_idx > len(df):
+        if start_idx < 0 or end_idx > n:
             print(f"Error: Window out of bounds. Idx={idx}, Range=[{start_idx}, {end_idx}]")
             return False
             
         # 2. Extract Data
-        # Shape: (80, 6) -> accelX,Y,Z, gyroX,Y,Z
-        cols = ['accelX', 'accelY', 'accelZ', 'gyroX', 'gyroY', 'gyroZ']
-        window_df = df.iloc[start_idx:end_idx][cols]
+        # Shape: (80, 6) -> accelX,Y,Z, gyroX,Y,Z (first 6 frame columns)
+        # A view on the session frames, only the window is read
+        window = session.window(start_idx, end_idx)[:, :6]
         
-        data_matrix = window_df.values.tolist()
+        # Samples inside a data gap are NaN (see CSVReader max_gap_ms)
+        if np.isnan(window).any():
+            print(f"Error: Window at {t_csv_ms:.0f}ms overlaps a data gap")
+            return False
         
-        if len(data_matrix) != self.WINDOW_SIZE:
-             print(f"Error: Slice length {len(data_matrix)} != {self.WINDOW_SIZE}")
+        if len(window) != self.WINDOW_SIZE:
+             print(f"Error: Slice length {len(window)} != {self.WINDOW_SIZE}")
              return False
              
-        # 3. Prepare JSON
-        record = {
-            "session_id": self._current_session_id,
-            "label": LabelType.to_str(label_type),
-            "label_id": int(label_type),
-            "timestamp_csv_ms": t_csv_ms, # Rel
-            # "timestamp_real": ... # Could add absolute time string
-            "sync_params": self._sync_manager.get_params() if self._sync_manager else {},
-            "data": data_matrix
-        }
-        
-        # 4. Append to file
+        # 3. Append to the label log (file stays open, one small binary record)
         try:
-            with open(self.get_output_path(), 'a', encoding='utf-8') as f:
-                f.write(json.dumps(record) + "\n")
+            self._get_store().append(
+                t_csv_ms, label_type, window if self.store_windows else None,
+                sync_params=self._sync_manager.get_params() if self._sync_manager else {}
+            )
             print(f"Label saved: {LabelType.to_str(label_type)} at {t_csv_ms:.0f}ms")
             return True
         except Exception as e:
@@ -114,34 +156,154 @@ class LabelManager:
             return False
 
     def undo_last_label(self):
-        """Remove last line from JSONL file"""
-        path = self.get_output_path()
-        if not os.path.exists(path):
-            return
+        """
+        Delete the last label (appends a tombstone, the log is never rewritten).
+        Returns the removed (t_csv_ms, label_id), or None.
+        """
+        if self._store is None and not self.has_labels():
+            return None
             
         try:
-            # Read all lines
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            if not lines:
-                return
-                
-            # Remove last
-            lines = lines[:-1]
-            
-            # Write back
-            with open(path, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
-                
-            print(f"Undo successful.")
-            
+            removed = self._get_store().undo()
+            if removed is not None:
+                print(f"Undo successful.")
+            return removed
         except Exception as e:
             print(f"Error undoing: {e}")
+            return None
+
+    def compact_labels(self):
+        """Drop deleted labels from the current session's log"""
+        if self._store is None and not self.has_labels():
+            return
+        self._get_store().compact()
+        print(f"Label log compacted: {len(self._store)} labels")
+
+    def export_labels(self, path=None):
+        """
+        Export the current session's labels as JSONL training data
+        (one record per label with its data window). Returns the path written.
+        """
+        path = path or self.get_export_path()
+        self._get_store().export_jsonl(path, self._current_session_id, LabelType.to_str, fill=self._materialize_one)
+        print(f"Exported {len(self._store)} labels to {path}")
+        return path
+
+    def _materialize_one(self, t_csv_ms):
+        """Window for a reference-only label (empty if it can't be sliced)"""
+        session = self._csv_reader.get_session() if self._csv_reader else None
+        if session is None:
+            return np.empty((0, 0), dtype=np.float32)
+        windows, valid = materialize_windows(session, [t_csv_ms], self.PRE_WINDOW, self.POST_WINDOW)
+        return windows[0] if valid[0] else np.empty((0, 0), dtype=np.float32)
+
+    def export_training_npz(self, path=None, pre=None, post=None):
+        """
+        Export the current session's labels as NumPy training tensors (.npz):
+        X (labels, pre + 1 + post, 6), y (labels,). Windows are sliced from the
+        loaded session in one gather, so any window shape works (default: current
+        PRE/POST_WINDOW), whether or not the labels were saved with data.
+        Labels whose window falls outside the data or into a gap are skipped.
+        Returns the path written, or None.
+        """
+        session = self._csv_reader.get_session() if self._csv_reader else None
+        if session is None:
+            print("Error: No CSV loaded")
+            return None
+        pre = self.PRE_WINDOW if pre is None else pre
+        post = self.POST_WINDOW if post is None else post
+        
+        labels = self._get_store().labels()
+        t_ms = np.array([t for t, _ in labels], dtype=np.float64)
+        label_ids = np.array([l_id for _, l_id in labels], dtype=np.int64)
+        windows, valid = materialize_windows(session, t_ms, pre, post)
+        if not valid.all():
+            print(f"Skipping {int((~valid).sum())} labels (window out of bounds / in a data gap)")
+        
+        path = path or os.path.join(self.output_dir, f"{self._current_session_id}.npz")
+        save_npz(path, windows[valid], label_ids[valid], t_ms[valid], self._current_session_id, pre, post)
+        print(f"Exported {int(valid.sum())} windows {windows.shape[1:]} to {path}")
+        return path
+
+    def _find_session(self, session_id):
+        """The loaded session if it matches, else a matching one from the frame cache"""
+        if self._csv_reader is None:
+            return None
+        if session_id == self._current_session_id and self._csv_reader.get_session() is not None:
+            return self._csv_reader.get_session()
+        for start_ms, key in self._csv_reader.get_cached_sessions():
+            if self.session_id_for(start_ms) == session_id:
+                return self._csv_reader.open_cached_session(key)
+        return None
+
+    def export_dataset(self, label_files, pre=None, post=None, out_prefix=None):
+        """
+        Build one training set from many label files (.labels or .jsonl).
+        
+        Each file is matched to its session by name (the session ID): the loaded
+        session, or one already processed into the frame cache. All windows of a
+        session are cut in one vectorized gather (see materialize_windows) and
+        written straight into memory-mapped .npy files, so changing the window
+        length only means running this again.
+        
+        Output: {out_prefix}_X.npy (K, pre + 1 + post, 6) float32 and
+        {out_prefix}_y.npy (K,) int64 label ids; labels whose window falls outside
+        the data or into a gap are skipped.
+        Returns (X, y) opened read-only (memory-mapped), or None if nothing was exported.
+        """
+        pre = self.PRE_WINDOW if pre is None else pre
+        post = self.POST_WINDOW if post is None else post
+        out_prefix = out_prefix or os.path.join(self.output_dir, f"dataset_pre{pre}_post{post}")
+        
+        # 1. Label times of every file, matched to their session; validity first so the output size is known
+        groups = []
+        for path in label_files:
+            session_id = os.path.splitext(os.path.basename(path))[0]
+            if session_id.endswith(self.EXPORT_SUFFIX):
+                session_id = session_id[:-len(self.EXPORT_SUFFIX)]
+            labels = self.load_labels(path)
+            if not labels:
+                continue
+            session = self._find_session(session_id)
+            if session is None:
+                print(f"Skipping {os.path.basename(path)}: session {session_id} is not loaded or cached")
+                continue
+            t_ms = np.array([t for t, _ in labels], dtype=np.float64)
+            label_ids = np.array([l_id for _, l_id in labels], dtype=np.int64)
+            _, valid = materialize_windows(session, t_ms, pre, post)
+            if not valid.all():
+                print(f"{os.path.basename(path)}: skipping {int((~valid).sum())} labels (window out of bounds / in a data gap)")
+            groups.append((session, t_ms[valid], label_ids[valid]))
+            
+        total = sum(len(t_ms) for _, t_ms, _ in groups)
+        if total == 0:
+            print("No labels to export.")
+            return None
+            
+        # 2. One gather per session, written into the memory-mapped output
+        x_path, y_path = f"{out_prefix}_X.npy", f"{out_prefix}_y.npy"
+        X = np.lib.format.open_memmap(x_path, mode='w+', dtype=np.float32, shape=(total, pre + 1 + post, 6))
+        y = np.lib.format.open_memmap(y_path, mode='w+', dtype=np.int64, shape=(total,))
+        k = 0
+        for session, t_ms, label_ids in groups:
+            X[k:k + len(t_ms)], _ = materialize_windows(session, t_ms, pre, post)
+            y[k:k + len(t_ms)] = label_ids
+            k += len(t_ms)
+        X.flush()
+        y.flush()
+        del X, y
+        
+        print(f"Exported {total} windows ({pre + 1 + post} x 6) from {len(groups)} sessions to {out_prefix}_X/y.npy")
+        return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+
+    # Fast path for JSONL: only these two fields are needed, the 'data' payload is never decoded
+    _JSONL_T_MS = re.compile(r'"timestamp_csv_ms":\s*(-?[0-9.eE+-]+)')
+    _JSONL_LABEL_ID = re.compile(r'"label_id":\s*(\d+)')
 
     def load_labels(self, file_path):
         """
-        Load labels from a JSONL file.
+        Load labels from a label log (.labels, via its sidecar index) or an
+        exported / legacy JSONL file (streamed, without parsing the data arrays).
         Returns a list of (timestamp_csv_ms, label_type_int)
         """
         results = []
@@ -149,14 +311,21 @@ class LabelManager:
             return results
             
         try:
+            if not file_path.endswith(".jsonl"):
+                return LabelStore.read_labels(file_path)
+                
             with open(file_path, 'r', encoding='utf-8') as f:
                 for line in f:
                     if not line.strip(): continue
-                    record = json.loads(line)
-                    # Extract info
-                    t_ms = record.get('timestamp_csv_ms', 0)
-                    l_id = record.get('label_id', 5) # Default to Other if missing
-                    results.append((t_ms, l_id))
+                    m_t = self._JSONL_T_MS.search(line)
+                    if m_t is None:
+                        # Unusual layout: fall back to a full parse of this line
+                        record = json.loads(line)
+                        results.append((record.get('timestamp_csv_ms', 0), record.get('label_id', 5)))
+                        continue
+                    m_id = self._JSONL_LABEL_ID.search(line)
+                    # Default to Other if missing
+                    results.append((float(m_t.group(1)), int(m_id.group(1)) if m_id else 5))
         except Exception as e:
             print(f"Error loading labels: {e}")
             
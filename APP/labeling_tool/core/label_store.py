@@ -0,0 +1,261 @@
+import os
+import json
+import struct
+import numpy as np
+
+
+class LabelStore:
+    """
+    Append-only binary label log with an in-memory index.
+
+    File: a sequence of records, each `kind (u8) | payload length (u32)` + payload
+    - LABEL:     label_id (u8), t_csv_ms (f64), rows (u16), cols (u16), sync json length (u16),
+                 sync params json, rows x cols float32 window
+                 (rows = cols = 0 for a reference-only label, see core.materializer)
+    - TOMBSTONE: label number (u32), i.e. the n-th LABEL record of the file is deleted
+
+    Saving a label appends one record to the already-open file; undo appends a
+    tombstone for the last live label. Both are O(1) whatever the session size.
+    compact() (drop deleted labels) and export_jsonl() are explicit operations.
+    A record cut short by a crash is dropped (truncated) when the log is opened.
+
+    Sidecar index `<log>.idx`: header (magic, log size it matches) + the live
+    labels as packed (t_ms f64, label_id u8) entries, in order. Kept in step on
+    every save (append an entry) and undo (truncate the last one), so
+    read_labels() reloads a session without touching the log; if the sizes
+    don't match (crash between the two writes, older log) only the record
+    headers of the log are scanned, read-only (the next writer repairs the files).
+    """
+
+    LABEL = 1
+    TOMBSTONE = 2
+
+    _HEADER = struct.Struct('<BI')
+    _LABEL = struct.Struct('<BdHHH')
+    _TOMBSTONE = struct.Struct('<I')
+
+    INDEX_SUFFIX = ".idx"
+    _INDEX_HEADER = struct.Struct('<4sQ')  # magic, log size
+    _INDEX_MAGIC = b'LIX1'
+    INDEX_DTYPE = np.dtype([('t_ms', '<f8'), ('label_id', 'u1')])
+
+    def __init__(self, path: str):
+        self.path = path
+        self._init_index()
+        self._scan()
+        self._file = open(self.path, 'ab')
+        self._write_index()
+
+    def _init_index(self):
+        self._offsets = []  # Record offset of each label, in file order
+        self._t_ms = []
+        self._label_ids = []
+        self._live = []     # False once tombstoned
+        self._stack = []    # Live label numbers in the order they were added (undo pops)
+
+    def __len__(self):
+        return len(self._stack)
+
+    def _scan(self, repair=True):
+        """
+        Rebuild the index from the log, reading only the record headers (payloads
+        are skipped with a seek). repair: cut off a torn last record; False never
+        writes to the file (read-only scan).
+        """
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        pos = 0
+        with open(self.path, 'rb') as f:
+            while pos + self._HEADER.size <= size:
+                f.seek(pos)
+                kind, length = self._HEADER.unpack(f.read(self._HEADER.size))
+                end = pos + self._HEADER.size + length
+                if end > size:
+                    break
+                if kind == self.LABEL:
+                    label_id, t_ms, _, _, _ = self._LABEL.unpack(f.read(self._LABEL.size))
+                    self._index_label(pos, t_ms, label_id)
+                elif kind == self.TOMBSTONE:
+                    (number,) = self._TOMBSTONE.unpack(f.read(self._TOMBSTONE.size))
+                    self._index_tombstone(number)
+                pos = end
+        if pos < size and repair:
+            print(f"Label log {os.path.basename(self.path)}: dropping {size - pos} bytes of an incomplete record")
+            with open(self.path, 'r+b') as f:
+                f.truncate(pos)
+
+    def _index_label(self, offset, t_ms, label_id):
+        self._stack.append(len(self._offsets))
+        self._offsets.append(offset)
+        self._t_ms.append(t_ms)
+        self._label_ids.append(label_id)
+        self._live.append(True)
+
+    def _index_tombstone(self, number):
+        if number < len(self._live) and self._live[number]:
+            self._live[number] = False
+            # Tombstones are (nearly always) for the newest live label
+            if self._stack and self._stack[-1] == number:
+                self._stack.pop()
+            else:
+                self._stack.remove(number)
+
+    @classmethod
+    def read_labels(cls, path: str) -> list:
+        """Live labels of a log as (t_csv_ms, label_id), from the sidecar index when it is up to date"""
+        try:
+            with open(path + cls.INDEX_SUFFIX, 'rb') as f:
+                magic, log_size = cls._INDEX_HEADER.unpack(f.read(cls._INDEX_HEADER.size))
+                if magic == cls._INDEX_MAGIC and log_size == os.path.getsize(path):
+                    entries = np.frombuffer(f.read(), dtype=cls.INDEX_DTYPE)
+                    return list(zip(entries['t_ms'].tolist(), entries['label_id'].tolist()))
+        except (OSError, struct.error, ValueError):
+            pass
+        # Index missing or stale: read-only scan of the log (nothing is repaired or rewritten)
+        store = cls.__new__(cls)
+        store.path = path
+        store._init_index()
+        store._scan(repair=False)
+        return store.labels()
+
+    def _write_index(self):
+        """Rewrite the whole sidecar index from the in-memory one"""
+        entries = np.empty(len(self._stack), dtype=self.INDEX_DTYPE)
+        entries['t_ms'] = [self._t_ms[i] for i in self._stack]
+        entries['label_id'] = [self._label_ids[i] for i in self._stack]
+        self._index = open(self.path + self.INDEX_SUFFIX, 'w+b')
+        self._index.write(self._INDEX_HEADER.pack(self._INDEX_MAGIC, self._file.tell()) + entries.tobytes())
+        self._index.flush()
+
+    def _update_index(self, entry=None):
+        """entry: (t_ms, label_id) appended after a save; None = drop the last one (undo)"""
+        end = self._INDEX_HEADER.size + len(self._stack) * self.INDEX_DTYPE.itemsize
+        if entry is None:
+            self._index.truncate(end)
+        else:
+            self._index.seek(end - self.INDEX_DTYPE.itemsize)
+            self._index.write(np.array([entry], dtype=self.INDEX_DTYPE).tobytes())
+        self._index.seek(0)
+        self._index.write(self._INDEX_HEADER.pack(self._INDEX_MAGIC, self._file.tell()))
+        self._index.flush()
+
+    def _append(self, kind, payload: bytes) -> int:
+        offset = self._file.tell()
+        self._file.write(self._HEADER.pack(kind, len(payload)) + payload)
+        # Flush to the OS (not fsync): survives an app crash, costs no disk round-trip
+        self._file.flush()
+        return offset
+
+    def append(self, t_csv_ms: float, label_id: int, window: np.ndarray = None, sync_params: dict = None):
+        """Add a label; window: (rows, cols) data slice stored with it (optional)"""
+        window = np.empty((0, 0), dtype='<f4') if window is None else np.ascontiguousarray(window, dtype='<f4')
+        sync = json.dumps(sync_params or {}).encode('utf-8')
+        payload = (self._LABEL.pack(int(label_id), float(t_csv_ms), window.shape[0], window.shape[1], len(sync))
+                   + sync + window.tobytes())
+        offset = self._append(self.LABEL, payload)
+        self._index_label(offset, float(t_csv_ms), int(label_id))
+        self._update_index((float(t_csv_ms), int(label_id)))
+
+    def undo(self):
+        """Delete the most recently added live label. Returns its (t_ms, label_id) or None."""
+        if not self._stack:
+            return None
+        number = self._stack[-1]
+        self._append(self.TOMBSTONE, self._TOMBSTONE.pack(number))
+        self._index_tombstone(number)
+        self._update_index()
+        return self._t_ms[number], self._label_ids[number]
+
+    def labels(self) -> list:
+        """Live labels as (t_csv_ms, label_id), in the order they were added"""
+        return [(self._t_ms[i], self._label_ids[i]) for i in self._stack]
+
+    def records(self):
+        """Yields the live labels as dicts (t_csv_ms, label_id, sync_params, data window)"""
+        self._file.flush()
+        with open(self.path, 'rb') as f:
+            for i in self._stack:
+                f.seek(self._offsets[i])
+                yield self._read_label(f)
+
+    def _read_label(self, f) -> dict:
+        _, length = self._HEADER.unpack(f.read(self._HEADER.size))
+        payload = f.read(length)
+        label_id, t_ms, rows, cols, sync_len = self._LABEL.unpack_from(payload)
+        pos = self._LABEL.size
+        sync = json.loads(payload[pos:pos + sync_len].decode('utf-8'))
+        pos += sync_len
+        data = np.frombuffer(payload, dtype='<f4', count=rows * cols, offset=pos).reshape(rows, cols)
+        return {"t_csv_ms": t_ms, "label_id": label_id, "sync_params": sync, "data": data}
+
+    def compact(self):
+        """Rewrite the log with only the live labels (drops tombstones and deleted labels)."""
+        self._file.flush()
+        tmp = f"{self.path}.tmp"
+        offsets = []
+        with open(self.path, 'rb') as src, open(tmp, 'wb') as dst:
+            for i in self._stack:
+                src.seek(self._offsets[i])
+                kind, length = self._HEADER.unpack(src.read(self._HEADER.size))
+                offsets.append(dst.tell())
+                dst.write(self._HEADER.pack(kind, length) + src.read(length))
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._offsets = offsets
+        self._t_ms = [self._t_ms[i] for i in self._stack]
+        self._label_ids = [self._label_ids[i] for i in self._stack]
+        self._live = [True] * len(offsets)
+        self._stack = list(range(len(offsets)))
+        self._file = open(self.path, 'ab')
+        self._index.close()
+        self._write_index()
+
+    @classmethod
+    def import_jsonl(cls, jsonl_path: str, path: str) -> int:
+        """
+        Create the log `path` from a JSONL label file (training format / labels
+        saved before the binary log existed), one line at a time. The log is built
+        under a temporary name and moved into place at the end, so an interrupted
+        import leaves no half-filled log behind. Returns the number of labels.
+        """
+        tmp = f"{path}.tmp"
+        store = cls(tmp)
+        try:
+            with open(jsonl_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    data = record.get('data')
+                    store.append(record.get('timestamp_csv_ms', 0), record.get('label_id', 5),
+                                 np.asarray(data, dtype='<f4') if data else None, record.get('sync_params'))
+            count = len(store)
+        finally:
+            store.close()
+        os.replace(tmp + cls.INDEX_SUFFIX, path + cls.INDEX_SUFFIX)
+        os.replace(tmp, path)
+        return count
+
+    def export_jsonl(self, path: str, session_id: str, to_str=str, fill=None):
+        """
+        Write the live labels in the JSONL training format (one record per line).
+        to_str: label id -> label name
+        fill: t_csv_ms -> window, for reference-only labels (stored without data)
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.records():
+                if record["data"].size == 0 and fill is not None:
+                    record["data"] = fill(record["t_csv_ms"])
+                f.write(json.dumps({
+                    "session_id": session_id,
+                    "label": to_str(record["label_id"]),
+                    "label_id": record["label_id"],
+                    "timestamp_csv_ms": record["t_csv_ms"],
+                    "sync_params": record["sync_params"],
+                    "data": record["data"].tolist(),
+                }) + "\n")
+
+    def close(self):
+        self._file.close()
+        self._index.close()
@@ -0,0 +1,47 @@
+import numpy as np
+
+# Channels that make up a training window: accelX,Y,Z, gyroX,Y,Z (first 6 frame columns)
+WINDOW_CHANNELS = 6
+
+
+def materialize_windows(session, t_csv_ms, pre: int, post: int, channels: int = WINDOW_CHANNELS):
+    """
+    Slice the label windows of any shape straight from the session frames.
+
+    t_csv_ms: (L,) label times (ms relative to the session start)
+    pre / post: frames before / after the label frame (window = pre + 1 + post rows)
+
+    The label frame is the first frame at or after t_csv_ms, like save_label.
+    All windows come from one vectorized gather (frames[indices]), so the cost
+    is the size of the output, not the number of labels.
+
+    Returns (windows (L, pre + 1 + post, channels) float32, valid (L,) bool);
+    windows that run out of the session or overlap a data gap (NaN) are invalid
+    and left as NaN.
+    """
+    t_csv_ms = np.asarray(t_csv_ms, dtype=np.float64).reshape(-1)
+    n = len(session)
+    centers = np.ceil(t_csv_ms / session.dt_ms).astype(np.int64)
+    np.minimum(centers, n - 1, out=centers)  # Same clamp as save_label
+
+    indices = centers[:, None] + np.arange(-pre, post + 1, dtype=np.int64)
+    valid = (indices[:, 0] >= 0) & (indices[:, -1] < n)
+    np.clip(indices, 0, max(n - 1, 0), out=indices)
+
+    windows = session.frames[:, :channels][indices] if n else np.full(indices.shape + (channels,), np.nan, dtype=np.float32)
+    valid &= ~np.isnan(windows).any(axis=(1, 2))
+    windows[~valid] = np.nan
+    return windows, valid
+
+
+def save_npz(path: str, windows: np.ndarray, label_ids, t_csv_ms, session_id: str, pre: int, post: int):
+    """Training tensors: X (L, T, 6) float32, y (L,) int64 label ids, plus label times and window shape."""
+    np.savez(
+        path,
+        X=windows.astype(np.float32, copy=False),
+        y=np.asarray(label_ids, dtype=np.int64),
+        t_csv_ms=np.asarray(t_csv_ms, dtype=np.float64),
+        session_id=np.array(session_id),
+        pre=np.array(pre),
+        post=np.array(post),
+    )
@@ -0,0 +1,45 @@
+import numpy as np
+from scipy.signal import find_peaks
+
+
+class PeakIndex:
+    """
+    Candidate swings: local maxima of a magnitude channel above a threshold.
+
+    Built once per (threshold, refractory, prominence) with scipy's find_peaks:
+    - refractory_ms: minimum spacing between peaks; within it only the highest survives
+    - prominence: how far (in g) a peak has to stand out from the signal around it,
+      so noise on top of one big swing doesn't produce several candidates
+    Data gaps (NaN) never produce peaks.
+
+    times_ms is sorted, so next/previous lookups are a searchsorted.
+    """
+
+    REFRACTORY_MS = 300
+    PROMINENCE = 1.0
+
+    def __init__(self, session, threshold: float, refractory_ms: float = REFRACTORY_MS,
+                 prominence: float = PROMINENCE, column: str = 'acc_mag'):
+        self.threshold = threshold
+        self.refractory_ms = refractory_ms
+        self.prominence = prominence
+        self.column = column
+
+        mag = np.nan_to_num(session.column(column), nan=0.0)
+        distance = max(int(round(refractory_ms / session.dt_ms)), 1)
+        peaks, props = find_peaks(mag, height=threshold, distance=distance, prominence=prominence)
+        self.times_ms = peaks * float(session.dt_ms)
+        self.magnitudes = props['peak_heights'].astype(np.float32)
+
+    def __len__(self):
+        return len(self.times_ms)
+
+    def next_after(self, t_ms: float):
+        """Index of the first peak after t_ms, or None"""
+        i = int(np.searchsorted(self.times_ms, t_ms, side='right'))
+        return i if i < len(self.times_ms) else None
+
+    def prev_before(self, t_ms: float):
+        """Index of the last peak before t_ms, or None"""
+        i = int(np.searchsorted(self.times_ms, t_ms, side='left')) - 1
+        return i if i >= 0 else None
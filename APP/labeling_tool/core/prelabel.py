@@ -0,0 +1,164 @@
+import os
+import sys
+import numpy as np
+from core.constants import LabelType
+from core.materializer import materialize_windows
+
+# Model backends (TFLite / ONNX loading, window fitting, class order) come from
+# the server's inference module, so pre-labels use exactly what the server predicts.
+# Same import as tools/simulate_app.py; build.bat passes the folder to PyInstaller.
+_SERVER_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "server"))
+if _SERVER_DIR not in sys.path:
+    sys.path.append(_SERVER_DIR)  # Appended: the server's main.py must not shadow ours
+from inference import DEFAULT_MODEL_CLASSES, load_backend
+
+# Candidate status
+PENDING, ACCEPTED, REJECTED = 0, 1, 2
+
+# Model output index -> LabelType, by class name (fails here if the two ever disagree)
+_LABEL_TYPES = {LabelType.to_str(t): t for t in LabelType}
+_unknown = [name for name in DEFAULT_MODEL_CLASSES if name not in _LABEL_TYPES]
+if _unknown:
+    raise ImportError(f"Model classes {_unknown} have no LabelType (see server/inference.py DEFAULT_MODEL_CLASSES)")
+MODEL_CLASSES = [_LABEL_TYPES[name] for name in DEFAULT_MODEL_CLASSES]
+
+
+def load_classifier(model_path: str):
+    """
+    Swing classifier backend for model_path (.tflite or .onnx), see server/inference.py.
+    predict(windows (B, T, 6)) -> class probabilities (B, len(MODEL_CLASSES));
+    windows are fitted to the model's input length there.
+    Raises BackendUnavailable if no runtime is installed, FileNotFoundError.
+    """
+    return load_backend("auto", model_path)
+
+
+def detect_impacts(session, std_multiplier: float = 2.0, merge_ms: float = 300,
+                   columns=('acc_mag', 'gyro_mag')):
+    """
+    Impact events of a whole session, in one vectorized pass.
+
+    Same idea as mark_label_by_time_new.py (threshold = mean + k * std, one event
+    per contiguous run above it, at the run's peak), but on both magnitudes at
+    once and without a Python loop over samples:
+    - each column is standardized (z-score) and the frame score is the larger one
+    - runs above std_multiplier are found with np.diff of the mask
+    - runs less than merge_ms apart count as one swing
+    - the peak of each run comes from np.maximum.reduceat over the runs
+
+    Data gaps (NaN) are never above the threshold.
+    Returns (frame indices (E,) int64, peak scores (E,) float32), sorted by time.
+    """
+    n = len(session)
+    score = np.full(n, -np.inf, dtype=np.float32)
+    for column in columns:
+        values = session.column(column)
+        mean, std = np.nanmean(values), np.nanstd(values)
+        if not np.isfinite(std) or std == 0:
+            continue
+        z = (values - mean) / std
+        np.fmax(score, z, out=score)  # fmax: NaN (gap) loses to the other column
+
+    above = score > std_multiplier
+    edges = np.diff(above.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # Exclusive
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    # Merge runs separated by less than merge_ms
+    gap = max(int(round(merge_ms / session.dt_ms)), 1)
+    keep = np.concatenate([[True], starts[1:] - ends[:-1] >= gap])
+    starts = starts[keep]
+    ends = ends[np.concatenate([keep[1:], [True]])]
+
+    # Flat index of every frame inside a run, and where each run begins in it
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+    values = score[positions]
+    peaks = np.maximum.reduceat(values, offsets)
+
+    # First frame of each run that reaches the run's peak
+    run = np.repeat(np.arange(len(starts)), lengths)
+    at_peak = np.flatnonzero(values == np.repeat(peaks, lengths))
+    _, first = np.unique(run[at_peak], return_index=True)
+    return positions[at_peak[first]], peaks.astype(np.float32)
+
+
+class Candidates:
+    """
+    Provisional labels of a session, waiting for the labeler.
+
+    times_ms / label_ids / scores are parallel arrays sorted by time; label_ids
+    is the suggested label (the classifier's, or default_label without a model),
+    scores its probability (NaN without a model). status tracks PENDING /
+    ACCEPTED / REJECTED, so navigation only does searchsorted lookups.
+    """
+
+    def __init__(self, times_ms, label_ids, scores):
+        self.times_ms = np.asarray(times_ms, dtype=np.float64)
+        self.label_ids = np.asarray(label_ids, dtype=np.int16)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.status = np.full(len(self.times_ms), PENDING, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.times_ms)
+
+    def pending(self):
+        """Indices of the candidates still waiting for a decision"""
+        return np.flatnonzero(self.status == PENDING)
+
+    def find(self, t_ms: float, tolerance_ms: float, status: int = PENDING):
+        """Index of the candidate (with the given status) within tolerance_ms of t_ms, or None"""
+        i = int(np.searchsorted(self.times_ms, t_ms))
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self.times_ms) and self.status[j] == status:
+                distance = abs(self.times_ms[j] - t_ms)
+                if distance <= tolerance_ms and (best is None or distance < abs(self.times_ms[best] - t_ms)):
+                    best = j
+        return best
+
+    def next_pending(self, t_ms: float):
+        """Index of the first pending candidate after t_ms, or None"""
+        pending = self.pending()
+        i = int(np.searchsorted(self.times_ms[pending], t_ms, side='right'))
+        return int(pending[i]) if i < len(pending) else None
+
+    def resolve(self, i: int, status: int, label_id: int = None):
+        self.status[i] = status
+        if label_id is not None:
+            self.label_ids[i] = label_id
+
+
+def prelabel_session(session, pre: int, post: int, scorer=None,
+                     std_multiplier: float = 2.0, merge_ms: float = 300,
+                     default_label: int = LabelType.OTHER, batch_size: int = 512) -> Candidates:
+    """
+    Batch pre-labeling of a whole session: detect impacts, then (with a model)
+    classify all candidate windows in batches of batch_size.
+
+    pre / post: label window (frames), the same one save_label stores.
+    scorer: a backend from load_classifier (None = detection only).
+    Windows that leave the session or overlap a gap keep default_label.
+    """
+    frames, peaks = detect_impacts(session, std_multiplier, merge_ms)
+    times_ms = frames * float(session.dt_ms)
+    label_ids = np.full(len(frames), int(default_label), dtype=np.int16)
+    scores = np.full(len(frames), np.nan, dtype=np.float32)
+
+    if scorer is not None and len(frames):
+        windows, valid = materialize_windows(session, times_ms, pre, post)
+        index = np.flatnonzero(valid)
+        classes = np.asarray(MODEL_CLASSES, dtype=np.int16)
+        for b in range(0, len(index), batch_size):
+            batch = index[b:b + batch_size]
+            probs = scorer.predict(windows[batch])
+            best = probs.argmax(axis=1)
+            label_ids[batch] = classes[best]
+            scores[batch] = probs[np.arange(len(batch)), best]
+
+    print(f"Pre-label: {len(frames)} candidates (> {std_multiplier:g} std)"
+          + (f", classified ({scorer.name})" if scorer is not None else ""))
+    return Candidates(times_ms, label_ids, scores)
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class MinMaxPyramid:
+    """
+    Min/max decimation pyramid of the (N, 8) session frames, for drawing.
+
+    Level k groups the frames into buckets of BASE * FACTOR**k frames and keeps the
+    min and max of every channel per bucket, interleaved as rows (2 * buckets, 8):
+    row 2j = min of bucket j, row 2j+1 = max. Drawn as a line, that is exactly the
+    envelope the full-resolution curve would paint at that zoom, so peaks never
+    disappear when zoomed out.
+
+    select() picks the finest level that still fits the visible range into the
+    available pixels, so a draw costs O(pixels) however long the recording is.
+    NaN frames (data gaps) are ignored; an all-NaN bucket stays NaN.
+    """
+
+    BASE = 8          # Frames per bucket at level 0
+    FACTOR = 4        # Bucket size ratio between consecutive levels
+    MIN_BUCKETS = 512 # Stop once a level has no more buckets than this
+
+    def __init__(self, frames: np.ndarray, levels: list[np.ndarray] = None):
+        self.frames = frames
+        self.levels = self.build(frames) if levels is None else levels
+
+    @classmethod
+    def bucket_sizes(cls, n: int) -> list[int]:
+        """Bucket size of each level for a session of n frames"""
+        sizes = []
+        bucket, count = cls.BASE, n
+        while count > cls.MIN_BUCKETS:
+            sizes.append(bucket)
+            count = -(-n // bucket)
+            bucket *= cls.FACTOR
+        return sizes
+
+    @classmethod
+    def build(cls, frames: np.ndarray) -> list[np.ndarray]:
+        levels = []
+        mins = maxs = frames
+        group = 1
+        for bucket in cls.bucket_sizes(len(frames)):
+            k = bucket // group
+            mins, maxs = cls._reduce(mins, k, np.fmin), cls._reduce(maxs, k, np.fmax)
+            group = bucket
+            level = np.empty((2 * len(mins), frames.shape[1]), dtype=np.float32)
+            level[0::2] = mins
+            level[1::2] = maxs
+            levels.append(level)
+        return levels
+
+    @staticmethod
+    def _reduce(values: np.ndarray, k: int, ufunc) -> np.ndarray:
+        """ufunc over consecutive groups of k rows (last group may be shorter)"""
+        full = len(values) // k
+        out = np.empty((-(-len(values) // k), values.shape[1]), dtype=np.float32)
+        ufunc.reduce(values[:full * k].reshape(full, k, -1), axis=1, out=out[:full])
+        if full < len(out):
+            ufunc.reduce(values[full * k:], axis=0, out=out[full])
+        return out
+
+    def select(self, i0: int, i1: int, max_points: int, dt_ms: float):
+        """
+        Data to draw frames [i0, i1) with at most ~max_points points per curve.
+        Returns (x_ms (M,) float64, values (M, 8) view): the raw frames if they fit,
+        otherwise the rows of the finest pyramid level that does.
+        """
+        n = len(self.frames)
+        i0, i1 = max(i0, 0), min(i1, n)
+        if i1 <= i0:
+            return np.empty(0), self.frames[:0]
+        if i1 - i0 <= max_points or not self.levels:
+            return np.arange(i0, i1, dtype=np.float64) * dt_ms, self.frames[i0:i1]
+
+        sizes = self.bucket_sizes(n)
+        for bucket, level in zip(sizes, self.levels):
+            if 2 * (-(-(i1 - i0) // bucket)) <= max_points:
+                break
+        j0, j1 = i0 // bucket, -(-i1 // bucket)
+        # Both points of a bucket sit at the bucket centre
+        x = np.repeat((np.arange(j0, j1, dtype=np.float64) * bucket + (bucket - 1) / 2) * dt_ms, 2)
+        return x, level[2 * j0:2 * j1]
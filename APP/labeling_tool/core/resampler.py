@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def resample_linear(t_ms: np.ndarray, values: np.ndarray, dt_ms: int = 20, max_gap_ms=None, grid_start=None):
+    """
+    Resample irregular samples onto a fixed grid by linear interpolation in time.
+
+    t_ms:   (N,) int64, strictly increasing (sorted, no duplicates)
+    values: (N, C) channels, interpolated as float32
+    max_gap_ms: if set, grid points that fall between two raw samples more than
+        max_gap_ms apart are marked invalid (NaN) instead of being bridged.
+    grid_start: first grid point (default t_ms[0]); used when resampling a long
+        recording chunk by chunk, so every chunk continues the same grid.
+
+    One searchsorted to find each grid point's left/right raw neighbours, then a lerp,
+    so memory is a few (M, C) float32 arrays, no union index or intermediate frames.
+
+    Returns (grid_ms (M,) int64, out (M, C) float32, valid (M,) bool);
+    the grid runs from grid_start to t_ms[-1] in steps of dt_ms.
+    """
+    t_ms = np.asarray(t_ms, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float32)
+    n = len(t_ms)
+    start = t_ms[0] if n and grid_start is None else grid_start
+    if n == 0 or start > t_ms[-1]:
+        return np.empty(0, dtype=np.int64), np.empty((0, values.shape[1]), dtype=np.float32), np.empty(0, dtype=bool)
+    if start < t_ms[0]:
+        raise ValueError("grid_start is before the first sample")
+
+    count = int((t_ms[-1] - start) // dt_ms) + 1
+    grid = start + np.arange(count, dtype=np.int64) * dt_ms
+    if n == 1:
+        return grid, values[:1].copy(), np.ones(1, dtype=bool)
+
+    # Raw samples bracketing each grid point: t[left] <= grid < t[right]
+    right = np.searchsorted(t_ms, grid, side='right')
+    np.clip(right, 1, n - 1, out=right)
+    left = right - 1
+
+    t_left = t_ms[left]
+    span = t_ms[right] - t_left
+    frac = ((grid - t_left) / span).astype(np.float32)
+
+    out = values[left]
+    out += frac[:, None] * (values[right] - out)
+
+    valid = np.ones(count, dtype=bool)
+    if max_gap_ms is not None:
+        # A grid point landing exactly on a raw sample is always valid
+        valid = (span <= max_gap_ms) | (grid == t_left)
+        out[~valid] = np.nan
+    return grid, out, valid
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from core.frame_cache import FrameCache
+from core.pyramid import MinMaxPyramid
+
+
+class Session:
+    """
+    A loaded recording on the fixed 50Hz grid.
+
+    frames: one contiguous (N, 8) float32 array (see FrameCache.COLUMNS),
+        possibly a read-only memmap
+    start_ms: epoch ms of frame 0 (naive local time)
+    dt_ms: grid step; frame i is at t_ms = i * dt_ms (relative to start)
+    pyramid: MinMaxPyramid of the frames for drawing (built on first use if not given)
+
+    There is no time column: times and indices convert with index arithmetic,
+    and every accessor returns a view on `frames`, never a copy.
+    """
+
+    COLUMNS = FrameCache.COLUMNS
+
+    def __init__(self, frames: np.ndarray, start_ms: int, dt_ms: int = 20, pyramid: MinMaxPyramid = None):
+        self.frames = frames
+        self.start_ms = int(start_ms)
+        self.dt_ms = dt_ms
+        self._pyramid = pyramid
+
+    @property
+    def pyramid(self) -> MinMaxPyramid:
+        if self._pyramid is None:
+            self._pyramid = MinMaxPyramid(self.frames)
+        return self._pyramid
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def duration_ms(self) -> float:
+        return float((len(self.frames) - 1) * self.dt_ms) if len(self.frames) else 0.0
+
+    @property
+    def start_datetime(self) -> datetime:
+        return pd.Timestamp(self.start_ms, unit='ms').to_pydatetime()
+
+    def column(self, name: str) -> np.ndarray:
+        """(N,) view of one channel, e.g. 'acc_mag'"""
+        return self.frames[:, self.COLUMNS.index(name)]
+
+    def index_at(self, t_ms: float) -> int:
+        """Index of the first frame at or after t_ms (may be out of range)"""
+        return int(np.ceil(t_ms / self.dt_ms))
+
+    def t_ms(self, i0: int = 0, i1: int = None) -> np.ndarray:
+        """Relative times of frames [i0, i1), computed (not stored)"""
+        i1 = len(self.frames) if i1 is None else i1
+        return np.arange(i0, i1, dtype=np.float64) * self.dt_ms
+
+    def window(self, i0: int, i1: int) -> np.ndarray:
+        """Frames [i0, i1) (clipped to the session), (n, 8) view"""
+        n = len(self.frames)
+        i0 = min(max(i0, 0), n)
+        return self.frames[i0:min(max(i1, i0), n)]
+
+    def range(self, t0_ms: float, t1_ms: float) -> tuple[int, int]:
+        """Index bounds [i0, i1) of the frames with t0_ms <= t_ms < t1_ms"""
+        n = len(self.frames)
+        i0 = min(max(self.index_at(t0_ms), 0), n)
+        return i0, min(max(self.index_at(t1_ms), i0), n)
+
+    def to_dataframe(self, i0: int = 0, i1: int = None) -> pd.DataFrame:
+        """
+        Frames [i0, i1) as a DataFrame (datetime index + t_ms column), for code that
+        still wants pandas. The float32 block is used as-is, no copy.
+        """
+        i1 = len(self.frames) if i1 is None else i1
+        t_ms = self.t_ms(i0, i1)
+        index = pd.to_datetime(self.start_ms + t_ms.astype(np.int64), unit='ms')
+        df = pd.DataFrame(self.frames[i0:i1], columns=self.COLUMNS, index=index, copy=False)
+        df['t_ms'] = t_ms
+        return df
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# Android CSVManager writes timestamps as 'yyyy/MM/dd HH:mm:ss.SSS' (23 chars)
+TIMESTAMP_FORMAT = '%Y/%m/%d %H:%M:%S.%f'
+TIMESTAMP_WIDTH = 23
+
+# Rows are handled as 24 bytes (23 chars + the NUL that marks the end of the string),
+# i.e. three little-endian uint64 words per row
+_ROW_BYTES = 24
+_SEPARATORS = {4: '/', 7: '/', 10: ' ', 13: ':', 16: ':', 19: '.'}
+
+# Subtracting the template leaves digit values at digit positions and 0 everywhere else.
+# A byte is malformed if (after wrap-around) it exceeds its limit: 9 for digits, 0 otherwise.
+_TEMPLATE = np.array([ord(_SEPARATORS.get(i, '0')) for i in range(TIMESTAMP_WIDTH)] + [0], dtype=np.uint8)
+_LIMIT = np.array([0 if i in _SEPARATORS else 9 for i in range(TIMESTAMP_WIDTH)] + [0], dtype=np.uint8)
+# SWAR: ((x & 0x7F) + (0x7F - limit)) sets a byte's high bit iff x > limit (for x < 0x80)
+_ADDEND = (0x7F - _LIMIT).view('<u8')
+_LOW7 = np.uint64(0x7F7F7F7F7F7F7F7F)
+_HIGH = np.uint64(0x8080808080808080)
+# 'yyyy/MM/dd HH' lives in bytes 0-12 (word 0 + low 5 bytes of word 1)
+_HOUR_PREFIX_MASK = np.uint64(0x000000FFFFFFFFFF)
+
+_DAYS_BEFORE_MONTH = np.array([0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334], dtype=np.int64)
+_DAYS_IN_MONTH = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def _number(digits: np.ndarray, start: int, end: int, dtype=np.int32) -> np.ndarray:
+    value = digits[:, start].astype(dtype)
+    for i in range(start + 1, end):
+        value = value * 10 + digits[:, i]
+    return value
+
+
+def _hour_start_ms(digits: np.ndarray):
+    """
+    Epoch ms of 'yyyy/MM/dd HH:00:00.000' for each row of digits, plus a validity mask.
+    Only called on the (few) rows where the date or hour changes.
+    """
+    year = _number(digits, 0, 4, np.int64)
+    month = _number(digits, 5, 7, np.int64)
+    day = _number(digits, 8, 10, np.int64)
+    hour = _number(digits, 11, 13, np.int64)
+
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    safe_month = np.clip(month, 0, 12)
+    ok = (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24)
+    ok &= day <= _DAYS_IN_MONTH[safe_month] - ((safe_month == 2) & ~leap)
+
+    # Days from 1970-01-01 (proleptic Gregorian)
+    y = year - 1
+    days = y * 365 + y // 4 - y // 100 + y // 400 - 719162
+    days += _DAYS_BEFORE_MONTH[safe_month] + ((safe_month > 2) & leap) + day - 1
+    return (days * 24 + hour) * 3_600_000, ok
+
+
+def parse_android_timestamps(values) -> np.ndarray:
+    """
+    Parse 'yyyy/MM/dd HH:mm:ss.SSS' strings into datetime64[ms] (naive, no timezone).
+
+    Well-formed rows are decoded straight from the fixed-width bytes with NumPy:
+    - validation of every character is a few uint64 operations per row
+    - date/hour are only computed where they change (a session is time-ordered,
+      so that's once per hour); each row just adds its mm:ss.SSS
+    Rows that don't match the layout (wrong width, non-ASCII, out-of-range fields)
+    fall back to pandas; rows pandas can't parse either come back as NaT.
+    """
+    values = np.asarray(values, dtype=object)
+    n = len(values)
+    out = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)  # int64 min == NaT
+    if n == 0:
+        return out.view('datetime64[ms]')
+
+    # One extra char so that strings longer than 23 chars are detected, not truncated
+    try:
+        buf = values.astype(f'S{_ROW_BYTES}').view(np.uint8).reshape(n, _ROW_BYTES)
+    except UnicodeEncodeError:
+        # A non-ASCII row somewhere: go through code points, mapping non-ASCII to 0xFF (always invalid)
+        codes = values.astype(f'U{_ROW_BYTES}').view(np.uint32).reshape(n, _ROW_BYTES)
+        buf = np.where(codes < 0x80, codes, 0xFF).astype(np.uint8)
+    except (TypeError, ValueError):
+        buf = None
+
+    ok = np.zeros(n, dtype=bool)
+    if buf is not None:
+        # buf is a fresh array, so everything below works in place on it
+        digits = np.subtract(buf, _TEMPLATE, out=buf)
+        words = digits.view('<u8')
+        bad = np.bitwise_and(words, _LOW7)
+        bad += _ADDEND
+        bad |= words
+        bad &= _HIGH
+        ok = (bad[:, 0] | bad[:, 1] | bad[:, 2]) == 0
+
+        # Runs of rows sharing the same 'yyyy/MM/dd HH'
+        head0, head1 = words[:, 0], words[:, 1] & _HOUR_PREFIX_MASK
+        change = np.empty(n, dtype=bool)
+        change[0] = True
+        np.not_equal(head0[1:], head0[:-1], out=change[1:])
+        change[1:] |= head1[1:] != head1[:-1]
+        starts = np.flatnonzero(change)
+        run_ms, run_ok = _hour_start_ms(digits[starts])
+        run = np.cumsum(change) - 1
+
+        minute = _number(digits, 14, 16)
+        second = _number(digits, 17, 19)
+        ok &= run_ok[run] & (minute < 60) & (second < 60)
+        in_hour = (minute * 60 + second) * 1000 + _number(digits, 20, 23)
+        np.add(run_ms[run], in_hour, out=out, where=ok)
+
+    bad_rows = np.flatnonzero(~ok)
+    if len(bad_rows):
+        fallback = pd.to_datetime(pd.Series(values[bad_rows]), format='mixed', errors='coerce')
+        out[bad_rows] = fallback.to_numpy(dtype='datetime64[ms]').view(np.int64)
+    return out.view('datetime64[ms]')
@@ -5,16 +5,18 @@ import os
 os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout, 
-                               QWidget, QFileDialog, QMenuBar, QMenu, QSplitter)
+                               QWidget, QFileDialog, QMenuBar, QMenu, QSplitter, QDockWidget)
 from PySide6.QtGui import QAction
 from PySide6.QtCore import Qt
 from ui.graph_widget import GraphWidget
 from ui.video_player import VideoPlayer
 from ui.sync_widget import SyncWidget
 from ui.label_widget import LabelWidget
+from ui.peak_list_widget import PeakListWidget
 from core.csv_reader import CSVReader
 from core.sync_manager import SyncManager
 from core.label_manager import LabelManager
+from core.prelabel import prelabel_session, load_classifier, ACCEPTED, REJECTED, PENDING
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -30,6 +32,7 @@ class MainWindow(QMainWindow):
         # State
         self.is_sync_locked = True
         self.current_t_csv = 0.0
+        self.candidates = None # core.prelabel.Candidates of the loaded session
         
         # Central Widget & Main Layout
         central_widget = QWidget()
@@ -59,6 +62,12 @@ class MainWindow(QMainWindow):
         # Set initial sizes
         self.splitter.setSizes([450, 450])
         
+        # 5. Peak List (Right Dock)
+        self.peak_list = PeakListWidget()
+        self.peak_dock = QDockWidget("Peaks", self)
+        self.peak_dock.setWidget(self.peak_list)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.peak_dock)
+        
         # Setup Menu
         self._setup_menu()
         
@@ -72,6 +81,10 @@ class MainWindow(QMainWindow):
         # Graph -> Video
         self.graph_widget.cursor_changed.connect(self._on_graph_cursor_changed)
         
+        # Peaks: Graph -> List, List -> Graph (jump moves the video too via cursor_changed)
+        self.graph_widget.peaks_changed.connect(self.peak_list.set_peaks)
+        self.peak_list.peak_selected.connect(self.graph_widget.jump_to)
+        
         # Sync Widget Signals
         self.sync_widget.set_anchor_a.connect(self._on_set_anchor_a)
         self.sync_widget.set_anchor_b.connect(self._on_set_anchor_b)
@@ -99,6 +112,11 @@ class MainWindow(QMainWindow):
         success = self.label_manager.save_label(label_type, t_csv)
         
         if success:
+            # A pending candidate under the cursor: the label decides it
+            i = self._current_candidate()
+            if i is not None:
+                self.candidates.resolve(i, ACCEPTED, label_type)
+            
             # 1. Show Marker on Graph
             # Calculate window ms (20ms per frame)
             pre_ms = self.label_manager.PRE_WINDOW * 20
@@ -107,16 +125,101 @@ class MainWindow(QMainWindow):
             
             # 2. Flash status or log
             print(f"Labeled: {label_type} at {t_csv}")
+            
+            if i is not None:
+                self._refresh_candidates()
+                self._next_candidate()
         else:
             # Show error (e.g. out of bounds)
             from PySide6.QtWidgets import QMessageBox
             QMessageBox.warning(self, "Label Failed", "Could not save label (Out of bounds?)")
 
     def _on_undo_triggered(self):
-        self.label_manager.undo_last_label()
+        removed = self.label_manager.undo_last_label()
         # Remove last marker from graph (Need to implement remove_last_marker in GraphWidget)
         self.graph_widget.remove_last_marker()
         
+        # Undoing a confirmed candidate puts it back in the queue
+        if removed is not None and self.candidates is not None:
+            i = self.candidates.find(removed[0], self._candidate_tolerance(), status=ACCEPTED)
+            if i is not None:
+                self.candidates.resolve(i, PENDING)
+                self._refresh_candidates()
+                
+    def _candidate_tolerance(self):
+        session = self.csv_reader.get_session()
+        return session.dt_ms if session is not None else 20
+        
+    def _current_candidate(self):
+        """Index of the pending candidate at the cursor, or None"""
+        if self.candidates is None:
+            return None
+        return self.candidates.find(self.graph_widget.get_cursor_position(), self._candidate_tolerance())
+        
+    def _refresh_candidates(self):
+        if self.candidates is None:
+            self.graph_widget.set_candidates([], [])
+            return
+        pending = self.candidates.pending()
+        self.graph_widget.set_candidates(self.candidates.times_ms[pending], self.candidates.label_ids[pending])
+        self.statusBar().showMessage(
+            f"Candidates: {len(pending)}/{len(self.candidates)} pending  |  "
+            f"(Enter) Accept  (1-5) Relabel  (X) Reject  (N) Next")
+        
+    def _next_candidate(self):
+        """Jump to the next pending candidate after the cursor"""
+        if self.candidates is None:
+            return
+        i = self.candidates.next_pending(self.graph_widget.get_cursor_position() + self._candidate_tolerance() / 2)
+        if i is None:
+            print("No more pending candidates.")
+            return
+        self.graph_widget.jump_to(self.candidates.times_ms[i])
+        
+    def _accept_candidate(self):
+        """Label the candidate at the cursor with its suggested label"""
+        i = self._current_candidate()
+        if i is not None:
+            self._on_label_triggered(int(self.candidates.label_ids[i]))
+            
+    def _reject_candidate(self):
+        i = self._current_candidate()
+        if i is not None:
+            self.candidates.resolve(i, REJECTED)
+            self._refresh_candidates()
+            self._next_candidate()
+            
+    def _prelabel(self, with_model=False):
+        """Detect swing candidates over the whole session (optionally classified by a model)"""
+        from PySide6.QtWidgets import QMessageBox
+        session = self.csv_reader.get_session()
+        if session is None or len(session) == 0:
+            QMessageBox.warning(self, "Pre-label", "Load CSV files first.")
+            return
+            
+        scorer = None
+        if with_model:
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Select Classifier Model", "", "Model Files (*.tflite *.onnx)"
+            )
+            if not file_path:
+                return
+            try:
+                scorer = load_classifier(file_path)
+            except Exception as e:
+                QMessageBox.warning(self, "Pre-label", f"Could not load model: {e}")
+                return
+                
+        try:
+            self.candidates = prelabel_session(session, self.label_manager.PRE_WINDOW,
+                                               self.label_manager.POST_WINDOW, scorer)
+        except Exception as e:
+            QMessageBox.warning(self, "Pre-label", f"Pre-labeling failed: {e}")
+            return
+        self._refresh_candidates()
+        if len(self.candidates):
+            self.graph_widget.jump_to(self.candidates.times_ms[0])
+        
     def keyPressEvent(self, event):
         # Handle hotkeys globally if widget doesn't catch them
         # 49 = '1', 53 = '5'
@@ -126,6 +229,12 @@ class MainWindow(QMainWindow):
             self._on_label_triggered(label_type)
         elif key == Qt.Key_Z:
             self._on_undo_triggered()
+        elif key in (Qt.Key_Return, Qt.Key_Enter):
+            self._accept_candidate()
+        elif key in (Qt.Key_X, Qt.Key_Delete):
+            self._reject_candidate()
+        elif key == Qt.Key_N:
+            self._next_candidate()
         else:
             super().keyPressEvent(event)
             
@@ -211,6 +320,49 @@ class MainWindow(QMainWindow):
         load_labels_action.triggered.connect(self._load_labels)
         file_menu.addAction(load_labels_action)
         
+        # Export / Compact Labels Actions (labels are saved to a binary log as you go)
+        export_labels_action = QAction("Export Labels (JSONL)...", self)
+        export_labels_action.triggered.connect(self._export_labels)
+        file_menu.addAction(export_labels_action)
+        
+        export_npz_action = QAction("Export Training Tensors (NPZ)...", self)
+        export_npz_action.triggered.connect(self._export_training_npz)
+        file_menu.addAction(export_npz_action)
+        
+        export_dataset_action = QAction("Export Dataset from Label Files...", self)
+        export_dataset_action.triggered.connect(self._export_dataset)
+        file_menu.addAction(export_dataset_action)
+        
+        compact_labels_action = QAction("Compact Label Log", self)
+        compact_labels_action.triggered.connect(self.label_manager.compact_labels)
+        file_menu.addAction(compact_labels_action)
+        
+        # Reference-only labels: don't copy the data window into the label log
+        ref_only_action = QAction("Reference-only Labels", self)
+        ref_only_action.setCheckable(True)
+        ref_only_action.setChecked(not self.label_manager.store_windows)
+        ref_only_action.toggled.connect(lambda checked: setattr(self.label_manager, 'store_windows', not checked))
+        file_menu.addAction(ref_only_action)
+        
+        # Pre-labeling: provisional markers to confirm (Enter / 1-5) or reject (X)
+        label_menu = menubar.addMenu("Pre-label")
+        prelabel_action = QAction("Detect Swing Candidates", self)
+        prelabel_action.triggered.connect(lambda: self._prelabel(with_model=False))
+        label_menu.addAction(prelabel_action)
+        
+        prelabel_model_action = QAction("Detect && Classify with Model...", self)
+        prelabel_model_action.triggered.connect(lambda: self._prelabel(with_model=True))
+        label_menu.addAction(prelabel_model_action)
+        
+        clear_candidates_action = QAction("Clear Candidates", self)
+        clear_candidates_action.triggered.connect(self._clear_candidates)
+        label_menu.addAction(clear_candidates_action)
+        
+    def _clear_candidates(self):
+        self.candidates = None
+        self._refresh_candidates()
+        self.statusBar().clearMessage()
+        
     def _load_video(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Open Video File", "", "Video Files (*.mp4 *.avi *.mov)"
@@ -219,9 +371,52 @@ class MainWindow(QMainWindow):
             print(f"Loading video: {file_path}")
             self.video_player.load_video(file_path)
             
+    def _export_labels(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Labels (JSONL)", self.label_manager.get_export_path(), "JSONL Files (*.jsonl)"
+        )
+        if not file_path:
+            return
+        try:
+            self.label_manager.export_labels(file_path)
+        except Exception as e:
+            from PySide6.QtWidgets import QMessageBox
+            QMessageBox.warning(self, "Export Labels", f"Export failed: {e}")
+            
+    def _export_training_npz(self):
+        default_path = os.path.splitext(self.label_manager.get_export_path())[0] + ".npz"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Training Tensors (NPZ)", default_path, "NumPy Files (*.npz)"
+        )
+        if not file_path:
+            return
+        try:
+            if self.label_manager.export_training_npz(file_path) is None:
+                raise RuntimeError("no CSV loaded")
+        except Exception as e:
+            from PySide6.QtWidgets import QMessageBox
+            QMessageBox.warning(self, "Export Training Tensors", f"Export failed: {e}")
+            
+    def _export_dataset(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Export Dataset: Select Label Files", "labels", "Label Files (*.labels *.jsonl)"
+        )
+        if not file_paths:
+            return
+        from PySide6.QtWidgets import QMessageBox
+        try:
+            result = self.label_manager.export_dataset(file_paths)
+        except Exception as e:
+            QMessageBox.warning(self, "Export Dataset", f"Export failed: {e}")
+            return
+        if result is None:
+            QMessageBox.warning(self, "Export Dataset", "No labels could be exported (sessions must be loaded once so they are cached).")
+        else:
+            QMessageBox.information(self, "Export Dataset", f"Exported {len(result[1])} windows of shape {result[0].shape[1:]}.")
+            
     def _load_labels(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Load Labels (JSONL)", "labels", "JSONL Files (*.jsonl);;All Files (*)"
+            self, "Load Labels", "labels", "Label Files (*.labels *.jsonl);;All Files (*)"
         )
         if not file_path:
             return
@@ -245,6 +440,11 @@ class MainWindow(QMainWindow):
         else:
              print("No labels found or error.")
         
+    def _on_csv_progress(self, done, total, path):
+        """Per-file progress from CSVReader.load_files (runs on the GUI thread)."""
+        self.statusBar().showMessage(f"Loading CSV {done}/{total}: {os.path.basename(path)}")
+        QApplication.processEvents()
+        
     def _load_csv_files(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
             self, "Open CSV Files", "", "CSV Files (*.csv)"
@@ -252,13 +452,16 @@ class MainWindow(QMainWindow):
         
         if file_paths:
             print(f"Loading {len(file_paths)} files...")
-            success = self.csv_reader.load_files(file_paths)
+            success = self.csv_reader.load_files(file_paths, progress=self._on_csv_progress)
+            self.statusBar().clearMessage()
             if success:
                 print("Load successful. Plotting...")
-                df = self.csv_reader.get_data()
+                session = self.csv_reader.get_session()
                 # Get start datetime (Naive)
                 start_dt = self.csv_reader.get_start_datetime() 
-                self.graph_widget.set_data(df, start_dt)
+                self.peak_list.set_start_datetime(start_dt)
+                self.graph_widget.set_data(session, start_dt)
+                self._clear_candidates()
                 
                 # Show Stats
                 stats = self.csv_reader.get_stats()
@@ -266,12 +469,21 @@ class MainWindow(QMainWindow):
                 # Init Label Manager
                 self.label_manager.set_context(self.csv_reader, self.sync_manager)
                 
+                # Labels already saved for this session (a legacy .jsonl is imported on first open)
+                existing = self.label_manager.current_labels()
+                pre_ms = self.label_manager.PRE_WINDOW * 20
+                post_ms = self.label_manager.POST_WINDOW * 20
+                for t_ms, l_type in existing:
+                    self.graph_widget.add_marker(t_ms, l_type, window_ms=(pre_ms, post_ms))
+                
                 from PySide6.QtWidgets import QMessageBox
                 msg = (f"Loaded successfully!\n\n"
                        f"Duration: {stats.get('duration_str', '?')}\n"
                        f"Expected (50Hz): {stats.get('expected_samples', 0)}\n"
                        f"Raw Count: {stats.get('raw_samples', 0)}\n"
-                       f"Missing/Drop Rate: {stats.get('missing_ratio', 0):.2%}")
+                       f"Missing/Drop Rate: {stats.get('missing_ratio', 0):.2%}\n"
+                       f"Gap Samples (invalid): {stats.get('gap_samples', 0)}\n"
+                       f"Existing Labels: {len(existing)}")
                 QMessageBox.information(self, "Data Info", msg)
             else:
                 print("Load failed.")
@@ -2,6 +2,8 @@ import pyqtgraph as pg
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QCheckBox, QHBoxLayout, QPushButton, QDoubleSpinBox, QLabel
 from PySide6.QtCore import Signal, Slot, Qt
 from datetime import datetime, timedelta
+from ui.marker_layer import MarkerLayer
+from core.peak_index import PeakIndex
 
 class TimeAxisItem(pg.AxisItem):
     def __init__(self, *args, **kwargs):
@@ -37,6 +39,8 @@ class GraphWidget(QWidget):
     
     # Cursor position changed signal (time in ms)
     cursor_changed = Signal(float)
+    # Peak index rebuilt (new session or threshold), see core.peak_index
+    peaks_changed = Signal(object)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -54,7 +58,7 @@ class GraphWidget(QWidget):
         self._controls_layout = QHBoxLayout()
         self._cb_magnitude = QCheckBox("Show Magnitude (合力)")
         self._cb_magnitude.setChecked(True)
-        self._cb_magnitude.stateChanged.connect(self._update_plots)
+        self._cb_magnitude.stateChanged.connect(self._on_magnitude_toggled)
         self._controls_layout.addWidget(self._cb_magnitude)
         
         # Spacer
@@ -66,8 +70,13 @@ class GraphWidget(QWidget):
         self._spin_thresh.setRange(0.5, 20.0)
         self._spin_thresh.setValue(3.0)
         self._spin_thresh.setSingleStep(0.5)
+        self._spin_thresh.valueChanged.connect(self._rebuild_peaks)
         self._controls_layout.addWidget(self._spin_thresh)
         
+        self._btn_prev_peak = QPushButton("(<<) Prev Peak")
+        self._btn_prev_peak.clicked.connect(self._find_prev_peak)
+        self._controls_layout.addWidget(self._btn_prev_peak)
+        
         self._btn_next_peak = QPushButton("Next Peak (>>)")
         self._btn_next_peak.clicked.connect(self._find_next_peak)
         self._controls_layout.addWidget(self._btn_next_peak)
@@ -116,189 +125,146 @@ class GraphWidget(QWidget):
         self._cursor_acc.sigPositionChanged.connect(self._on_cursor_dragged)
         self._cursor_gyro.sigPositionChanged.connect(self._on_cursor_dragged)
         
+        # Curves only hold what is visible, at the resolution the view can show
+        # (gyro X is linked, so the acc plot's signal covers both)
+        self._plot_acc.sigXRangeChanged.connect(self._on_x_range_changed)
+        
         # Data references
-        self._t = None # Relative time in ms
+        self._session = None # core.session.Session (times are index * dt_ms, no time array)
+        self._peaks = None # PeakIndex for the current threshold
         self._start_timestamp = 0 # Absolute unix timestamp in ms
         self._acc = None # [ax, ay, az, amag]
         self._gyro = None # [gx, gy, gz, gmag]
         
         # Curves references
-        self._curves_acc = {}
-        self._curves_gyro = {}
+        # Created once and kept: data changes go through setData, the magnitude
+        # checkbox only toggles visibility, so nothing is ever cleared and re-added
+        # X: Red, Y: Green, Z: Blue, Magnitude: white thick line
+        self._curves_acc = {
+            'x': self._plot_acc.plot(pen='r', name='X'),
+            'y': self._plot_acc.plot(pen='g', name='Y'),
+            'z': self._plot_acc.plot(pen='b', name='Z'),
+            'm': self._plot_acc.plot(pen=pg.mkPen('w', width=2), name='Mag'),
+        }
+        self._curves_gyro = {
+            'x': self._plot_gyro.plot(pen='r', name='X'),
+            'y': self._plot_gyro.plot(pen='g', name='Y'),
+            'z': self._plot_gyro.plot(pen='b', name='Z'),
+            'm': self._plot_gyro.plot(pen=pg.mkPen('w', width=2), name='Mag'),
+        }
+        
+        # Markers: one batched layer per plot (see MarkerLayer)
+        self._markers_acc = MarkerLayer()
+        self._markers_gyro = MarkerLayer()
+        self._plot_acc.addItem(self._markers_acc)
+        self._plot_gyro.addItem(self._markers_gyro)
+        
+        # Provisional markers from pre-labeling (dashed, see core.prelabel)
+        self._candidates_acc = MarkerLayer(style=Qt.DashLine)
+        self._candidates_gyro = MarkerLayer(style=Qt.DashLine)
+        self._plot_acc.addItem(self._candidates_acc)
+        self._plot_gyro.addItem(self._candidates_gyro)
         
-    def set_data(self, df, start_dt=None):
+    def set_data(self, session, start_dt=None):
         """
-        Set DataFrame from CSVReader.
-        Expected columns: t_ms, accelX/Y/Z, gyroX/Y/Z, acc_mag, gyro_mag
+        Set Session from CSVReader (see core.session).
+        Channels are column views on its float32 frames, nothing is copied.
         """
-        if df is None or df.empty:
+        if session is None or len(session) == 0:
             return
             
-        self._t = df['t_ms'].values
+        self._session = session
         self._start_timestamp = 0 # kept for compatibility if needed, but we rely on axis now
         
         # Update Axis with offset
-        if start_dt:
-            self._plot_gyro.getAxis('bottom').set_start_datetime(start_dt)
+        if start_dt is None:
+            start_dt = session.start_datetime
+        self._plot_gyro.getAxis('bottom').set_start_datetime(start_dt)
         
         self._acc = {
-            'x': df['accelX'].values,
-            'y': df['accelY'].values,
-            'z': df['accelZ'].values,
-            'm': df['acc_mag'].values
+            'x': session.column('accelX'),
+            'y': session.column('accelY'),
+            'z': session.column('accelZ'),
+            'm': session.column('acc_mag')
         }
         
         self._gyro = {
-            'x': df['gyroX'].values,
-            'y': df['gyroY'].values,
-            'z': df['gyroZ'].values,
-            'm': df['gyro_mag'].values
+            'x': session.column('gyroX'),
+            'y': session.column('gyroY'),
+            'z': session.column('gyroZ'),
+            'm': session.column('gyro_mag')
         }
         
         self.plot_all()
-        
-    def plot_all(self):
-        """Re-draw all curves."""
-        self._plot_acc.clear()
-        self._plot_gyro.clear()
-        
-        # Re-add cursors
-        self._plot_acc.addItem(self._cursor_acc)
-        self._plot_gyro.addItem(self._cursor_gyro)
+        self._rebuild_peaks()
         
     def add_marker(self, t_ms, label_type, window_ms=None):
         """
         Add a vertical line and optional range region.
         window_ms: tuple (pre_ms, post_ms)
         """
-        # Get color
-        from core.constants import LabelType
-        color = LabelType.get_color(label_type)
-        
-        # 1. Range Region (Background) - Draw FIRST so it's behind line
-        region_items = []
-        if window_ms:
-            pre_ms, post_ms = window_ms
-            # Faint gray brush: (R, G, B, Alpha) -> (100, 100, 100, 30)
-            brush = pg.mkBrush(150, 150, 150, 40)
-            
-            # Create regions for both plots
-            # movable=False to prevent user dragging
-            reg_acc = pg.LinearRegionItem(values=[t_ms - pre_ms, t_ms + post_ms], brush=brush, movable=False)
-            for l in reg_acc.lines: l.setPen(pg.mkPen(None)) # No border lines
-            
-            reg_gyro = pg.LinearRegionItem(values=[t_ms - pre_ms, t_ms + post_ms], brush=brush, movable=False)
-            for l in reg_gyro.lines: l.setPen(pg.mkPen(None))
-            
-            self._plot_acc.addItem(reg_acc)
-            self._plot_gyro.addItem(reg_gyro)
-            region_items = [reg_acc, reg_gyro]
-        
-        # 2. Key/Center Line
-        # Use SolidLine and Width=3 for better visibility
-        line_acc = pg.InfiniteLine(pos=t_ms, angle=90, pen=pg.mkPen(color, width=3, style=Qt.SolidLine))
-        line_gyro = pg.InfiniteLine(pos=t_ms, angle=90, pen=pg.mkPen(color, width=3, style=Qt.SolidLine))
-        
-        self._plot_acc.addItem(line_acc)
-        self._plot_gyro.addItem(line_gyro)
-        
-        # Store for Undo as a tuple (flat list of items to remove)
-        if not hasattr(self, '_markers'):
-            self._markers = []
-            
-        # marker_entry = ((lines), (regions))
-        self._markers.append(((line_acc, line_gyro), tuple(region_items)))
+        pre_ms, post_ms = window_ms if window_ms else (0, 0)
+        self._markers_acc.append(t_ms, label_type, pre_ms, post_ms)
+        self._markers_gyro.append(t_ms, label_type, pre_ms, post_ms)
         
     def remove_last_marker(self):
-        if hasattr(self, '_markers') and self._markers:
-            # Pop entry
-            (lines, regions) = self._markers.pop()
-            
-            # Remove lines
-            for l in lines:
-                if l in self._plot_acc.items: self._plot_acc.removeItem(l)
-                if l in self._plot_gyro.items: self._plot_gyro.removeItem(l)
-                
-            # Remove regions
-            for r in regions:
-                if r in self._plot_acc.items: self._plot_acc.removeItem(r)
-                if r in self._plot_gyro.items: self._plot_gyro.removeItem(r)
-
-    def plot_all(self):
-        """Re-draw all curves."""
-        self._plot_acc.clear()
-        self._plot_gyro.clear()
+        self._markers_acc.pop()
+        self._markers_gyro.pop()
         
-        # Re-add cursors
-        self._plot_acc.addItem(self._cursor_acc)
-        self._plot_gyro.addItem(self._cursor_gyro)
-        
-        # Re-add Markers
-        if hasattr(self, '_markers'):
-            try:
-                for entry in self._markers:
-                    # Determine format
-                    lines = []
-                    regions = []
-                    
-                    # New Format: tuple of 2 tuples -> ((l1,l2), (r1,r2))
-                    # Old Format: tuple of 2 lines -> (l1,l2)
-                    
-                    if len(entry) == 2 and isinstance(entry[0], tuple):
-                         # New Format
-                         lines = entry[0]
-                         regions = entry[1]
-                    else:
-                         # Old Format (assume just lines)
-                         lines = entry
-                         regions = []
+    def set_candidates(self, t_ms, label_types):
+        """Show the pending pre-label candidates (replaces the previous ones)."""
+        self._candidates_acc.set_markers(t_ms, label_types)
+        self._candidates_gyro.set_markers(t_ms, label_types)
 
-                    # Add Regions
-                    if regions:
-                        if len(regions) >= 2:
-                            if regions[0] and regions[0] not in self._plot_acc.items: 
-                                self._plot_acc.addItem(regions[0])
-                            if regions[1] and regions[1] not in self._plot_gyro.items: 
-                                self._plot_gyro.addItem(regions[1])
-
-                    # Add Lines
-                    if lines:
-                        if len(lines) >= 2:
-                             if lines[0] and lines[0] not in self._plot_acc.items: 
-                                self._plot_acc.addItem(lines[0])
-                             if lines[1] and lines[1] not in self._plot_gyro.items: 
-                                self._plot_gyro.addItem(lines[1])
-                                
-            except Exception as e:
-                print(f"Error restoring markers in plot_all: {e}")
-        
-        if self._t is None:
+    def plot_all(self):
+        """Load the session into the (persistent) curves and fit the view."""
+        if self._session is None:
             return
             
-        # Draw Accel
-        # X: Red, Y: Green, Z: Blue
-        self._plot_acc.plot(self._t, self._acc['x'], pen='r', name='X')
-        self._plot_acc.plot(self._t, self._acc['y'], pen='g', name='Y')
-        self._plot_acc.plot(self._t, self._acc['z'], pen='b', name='Z')
-        
-        # Draw Gyro
-        self._plot_gyro.plot(self._t, self._gyro['x'], pen='r', name='X')
-        self._plot_gyro.plot(self._t, self._gyro['y'], pen='g', name='Y')
-        self._plot_gyro.plot(self._t, self._gyro['z'], pen='b', name='Z')
-        
-        # Draw Magnitude if checked
-        if self._cb_magnitude.isChecked():
-            # White thick line for magnitude
-            self._plot_acc.plot(self._t, self._acc['m'], pen=pg.mkPen('w', width=2), name='Mag')
-            self._plot_gyro.plot(self._t, self._gyro['m'], pen=pg.mkPen('w', width=2), name='Mag')
+        # Curves start with the whole session (coarsest fitting level), then follow the view
+        self._update_curves(0, len(self._session))
             
         # Set Auto Range
         self._plot_acc.autoRange()
         self._plot_gyro.autoRange()
         
-    def _update_plots(self):
-        """Refresh plots (e.g. when checkbox changes)."""
-        self.plot_all()
+    def _update_curves(self, i0, i1):
+        """
+        Load frames [i0, i1) into the curves, decimated through the session's
+        min/max pyramid to about two points per horizontal pixel.
+        """
+        width_px = max(int(self._plot_acc.getViewBox().width()), 100)
+        x, values = self._session.pyramid.select(i0, i1, 2 * width_px, self._session.dt_ms)
+        
+        show_mag = self._cb_magnitude.isChecked()
+        columns = {'x': 0, 'y': 1, 'z': 2, 'm': 6}
+        for key, curve in self._curves_acc.items():
+            if key != 'm' or show_mag:
+                curve.setData(x, values[:, columns[key]])
+        columns = {'x': 3, 'y': 4, 'z': 5, 'm': 7}
+        for key, curve in self._curves_gyro.items():
+            if key != 'm' or show_mag:
+                curve.setData(x, values[:, columns[key]])
+            
+    def _on_x_range_changed(self, _view, x_range):
+        """Re-select the pyramid level / slice for the new visible range."""
+        if self._session is None:
+            return
+        min_x, max_x = x_range
+        # A little slack on both sides so small pans don't show empty edges
+        margin = (max_x - min_x) * 0.1
+        dt_ms = self._session.dt_ms
+        i0 = int((min_x - margin) // dt_ms)
+        i1 = int((max_x + margin) // dt_ms) + 2
+        self._update_curves(i0, i1)
+        
+    def _on_magnitude_toggled(self):
+        """Show/hide the magnitude curves (hidden curves are not kept up to date)."""
+        show_mag = self._cb_magnitude.isChecked()
+        self._curves_acc['m'].setVisible(show_mag)
+        self._curves_gyro['m'].setVisible(show_mag)
+        if show_mag and self._session is not None:
+            self._on_x_range_changed(None, self._plot_acc.viewRange()[0])
 
     def _on_cursor_dragged(self, line):
         """Sync cursors and emit signal."""
@@ -353,36 +319,38 @@ class GraphWidget(QWidget):
         """Return current cursor position (t_ms)"""
         return self._cursor_acc.value()
             
-    def _find_next_peak(self):
-        """Find next time point where Acc Mag > Threshold"""
-        if self._t is None or self._acc is None:
+    def _rebuild_peaks(self):
+        """Detect peaks once per session / threshold; navigation then only does lookups."""
+        if self._session is None:
             return
-            
-        threshold = self._spin_thresh.value()
-        current_t = self._cursor_acc.value()
-        
-        # BUFFER: Search starting 0.5s (500ms) after current cursor
-        # to avoid finding the same peak we are currently standing on.
-        start_search_t = current_t + 500
+        self._peaks = PeakIndex(self._session, self._spin_thresh.value())
+        print(f"Peak index: {len(self._peaks)} peaks > {self._peaks.threshold:.1f}g")
+        self.peaks_changed.emit(self._peaks)
         
-        # Helper: Find index of start_search_t
-        import numpy as np
+    def jump_to(self, t_ms):
+        """Move the cursor to t_ms as if the user had dragged it there."""
+        self.set_cursor_position(t_ms)
+        self.cursor_changed.emit(t_ms)
         
-        # Filter indices where t > start_search_t AND mag > threshold
-        mask = (self._t > start_search_t) & (self._acc['m'] > threshold)
+    def _jump_to_peak(self, i):
+        if i is None:
+            print("No more peaks found.")
+            return
+        t_ms = self._peaks.times_ms[i]
+        self.jump_to(t_ms)
+        print(f"Jumped to Peak at {t_ms:.0f}ms (Mag={self._peaks.magnitudes[i]:.2f}g)")
         
-        # Get indices usually returns a tuple of arrays
-        indices = np.where(mask)[0]
+    def _find_next_peak(self):
+        """Jump to the next detected peak after the cursor"""
+        if self._peaks is None:
+            return
+        # Half a frame of slack so the peak we are standing on isn't found again
+        slack = self._session.dt_ms / 2
+        self._jump_to_peak(self._peaks.next_after(self._cursor_acc.value() + slack))
         
-        if indices.size > 0:
-            next_idx = indices[0]
-            next_t = self._t[next_idx]
-            
-            # Move cursor
-            self.set_cursor_position(next_t)
-            self.cursor_changed.emit(next_t)
-            print(f"Jumped to Peak at {next_t:.0f}ms (Mag={self._acc['m'][next_idx]:.2f}g)")
-        else:
-            print("No more peaks found.")
-
-
+    def _find_prev_peak(self):
+        """Jump to the previous detected peak before the cursor"""
+        if self._peaks is None:
+            return
+        slack = self._session.dt_ms / 2
+        self._jump_to_peak(self._peaks.prev_before(self._cursor_acc.value() - slack))
@@ -0,0 +1,116 @@
+import numpy as np
+import pyqtgraph as pg
+from PySide6.QtCore import QLineF, QRectF, Qt
+from core.constants import LabelType
+
+
+class MarkerLayer(pg.GraphicsObject):
+    """
+    All label markers of one plot in a single graphics item.
+
+    Each marker is a vertical line at t_ms (colored by label type) plus an
+    optional faint window [t_ms - pre_ms, t_ms + post_ms]. Markers live in
+    NumPy arrays (grown by doubling), so append and undo (pop) are O(1) and
+    painting only draws the markers that intersect the visible range.
+    Markers don't take part in auto-range, like InfiniteLine.
+
+    style: line style, e.g. Qt.DashLine for provisional (pre-labeled) markers,
+    which are replaced in bulk with set_markers().
+    """
+
+    LINE_WIDTH = 3
+    REGION_BRUSH = (150, 150, 150, 40)  # Faint gray (R, G, B, Alpha)
+
+    def __init__(self, capacity=256, style=Qt.SolidLine):
+        super().__init__()
+        self._style = style
+        self._t = np.empty(capacity, dtype=np.float64)
+        self._pre = np.empty(capacity, dtype=np.float64)
+        self._post = np.empty(capacity, dtype=np.float64)
+        self._type = np.empty(capacity, dtype=np.int16)
+        self._count = 0
+        self._pens = {}
+        self._brush = pg.mkBrush(*self.REGION_BRUSH)
+        # Behind the curves
+        self.setZValue(-10)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, t_ms, label_type, pre_ms=0.0, post_ms=0.0):
+        if self._count == len(self._t):
+            for name in ('_t', '_pre', '_post', '_type'):
+                old = getattr(self, name)
+                grown = np.empty(2 * len(old), dtype=old.dtype)
+                grown[:self._count] = old[:self._count]
+                setattr(self, name, grown)
+        i = self._count
+        self._t[i], self._type[i] = t_ms, int(label_type)
+        self._pre[i], self._post[i] = pre_ms, post_ms
+        self._count += 1
+        self.update()
+
+    def pop(self):
+        """Remove the most recently added marker (undo)."""
+        if self._count:
+            self._count -= 1
+            self.update()
+
+    def set_markers(self, t_ms, label_types, pre_ms=0.0, post_ms=0.0):
+        """Replace all markers at once (arrays of equal length)."""
+        t_ms = np.asarray(t_ms, dtype=np.float64)
+        n = len(t_ms)
+        if n > len(self._t):
+            for name in ('_t', '_pre', '_post', '_type'):
+                setattr(self, name, np.empty(n, dtype=getattr(self, name).dtype))
+        self._t[:n] = t_ms
+        self._type[:n] = label_types
+        self._pre[:n], self._post[:n] = pre_ms, post_ms
+        self._count = n
+        self.update()
+
+    def clear(self):
+        self._count = 0
+        self.update()
+
+    def _pen(self, label_type):
+        pen = self._pens.get(label_type)
+        if pen is None:
+            pen = self._pens[label_type] = pg.mkPen(LabelType.get_color(label_type), width=self.LINE_WIDTH, style=self._style)
+        return pen
+
+    def dataBounds(self, axis, frac=1.0, orthoRange=None):
+        return None
+
+    def boundingRect(self):
+        # Covers whatever is visible (markers are unbounded vertically)
+        rect = self.viewRect()
+        return rect if rect is not None else QRectF()
+
+    def viewRangeChanged(self):
+        self.prepareGeometryChange()
+
+    def paint(self, p, *args):
+        rect = self.viewRect()
+        n = self._count
+        if rect is None or n == 0:
+            return
+        t, pre, post, types = self._t[:n], self._pre[:n], self._post[:n], self._type[:n]
+        left, right = rect.left(), rect.right()
+        top, height = rect.top(), rect.height()
+
+        # 1. Windows (behind the lines)
+        visible = np.flatnonzero((post + pre > 0) & (t + post >= left) & (t - pre <= right))
+        if len(visible):
+            p.setPen(pg.mkPen(None))
+            p.setBrush(self._brush)
+            for i in visible:
+                p.drawRect(QRectF(t[i] - pre[i], top, pre[i] + post[i], height))
+
+        # 2. Center lines, one drawLines call per label type
+        visible = np.flatnonzero((t >= left) & (t <= right))
+        if len(visible):
+            bottom = top + height
+            for label_type in np.unique(types[visible]):
+                p.setPen(self._pen(int(label_type)))
+                p.drawLines([QLineF(t[i], top, t[i], bottom) for i in visible[types[visible] == label_type]])
@@ -0,0 +1,51 @@
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QListWidget, QListWidgetItem, QLabel
+from PySide6.QtCore import Signal, Qt
+from datetime import datetime, timedelta
+
+class PeakListWidget(QWidget):
+    """
+    List of the detected peaks (candidate swings) of the current session.
+    Emits 'peak_selected(t_ms)' when a row is clicked / activated.
+    """
+
+    peak_selected = Signal(float) # t_ms (relative)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._start_dt = datetime.min
+        self._setup_ui()
+
+    def _setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self._lbl_count = QLabel("No peaks")
+        self._lbl_count.setStyleSheet("color: gray;")
+        layout.addWidget(self._lbl_count)
+
+        self._list = QListWidget()
+        # All rows have the same height, lets Qt skip measuring thousands of items
+        self._list.setUniformItemSizes(True)
+        self._list.itemClicked.connect(self._on_item_selected)
+        self._list.itemActivated.connect(self._on_item_selected)
+        layout.addWidget(self._list)
+
+    def set_start_datetime(self, dt):
+        self._start_dt = dt
+
+    def set_peaks(self, peaks):
+        """peaks: core.peak_index.PeakIndex"""
+        self._list.clear()
+        self._lbl_count.setText(f"{len(peaks)} peaks > {peaks.threshold:.1f}g")
+
+        self._list.setUpdatesEnabled(False)
+        for t_ms, mag in zip(peaks.times_ms, peaks.magnitudes):
+            # Absolute time like the graph axis (Naive: Start + Delta)
+            time_str = (self._start_dt + timedelta(milliseconds=float(t_ms))).strftime("%H:%M:%S.%f")[:-3]
+            item = QListWidgetItem(f"{time_str}   {mag:5.2f}g")
+            item.setData(Qt.UserRole, float(t_ms))
+            self._list.addItem(item)
+        self._list.setUpdatesEnabled(True)
+
+    def _on_item_selected(self, item):
+        self.peak_selected.emit(item.data(Qt.UserRole))
@@ -0,0 +1,60 @@
+"""
+每條連線的輸入佇列 (Per-connection Backpressure)
+
+WebSocket 連線分成兩個同時執行的 task：
+- 接收 (receive)：一直讀 socket、解碼，把要推論的 window 放進這裡的佇列
+- 處理 (process)：從佇列拿 window 去推論，再把結果送回手機
+
+推論變慢時接收端也不會停下來，但佇列有上限，
+某一支手機送太快時，多出來的 window 依 policy 處理，不會無限制吃記憶體、拖慢其他人：
+
+- drop_oldest：丟掉佇列裡最舊的 window，保留新的
+- coalesce：把還在排隊的 window 全部合併成最新的這一個 (只算最新的狀態)
+- reject：新的 window 不收，回傳 {"type": "overloaded", ...} 告訴手機
+"""
+import asyncio
+from collections import deque
+
+import metrics
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "reject")
+
+
+class BoundedWindowQueue:
+    """
+    maxsize: 最多排隊幾個 window
+    policy: 佇列滿了的處理方式 (見 OVERFLOW_POLICIES)
+    """
+
+    def __init__(self, maxsize: int = 8, policy: str = "drop_oldest"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items = deque()
+        self._not_empty = asyncio.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item) -> bool:
+        """放入一個 window (不會等待)；回傳 False 代表被 reject"""
+        if len(self._items) >= self.maxsize:
+            if self.policy == "reject":
+                metrics.WINDOWS_DROPPED.inc(1, "reject")
+                return False
+            if self.policy == "coalesce":
+                metrics.WINDOWS_COALESCED.inc(len(self._items))
+                self._items.clear()
+            else:
+                metrics.WINDOWS_DROPPED.inc(1, "drop_oldest")
+                self._items.popleft()
+        self._items.append(item)
+        self._not_empty.set()
+        return True
+
+    async def get(self):
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self._items.popleft()
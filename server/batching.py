@@ -0,0 +1,164 @@
+"""
+微批次推論排程器 (Micro-batching Inference Scheduler)
+
+所有 WebSocket 連線共用一個佇列 (queue)：
+每條連線把自己的 window 丟進佇列後，await 一個 Future 等結果。
+背景的 _run() 迴圈會等「最多 max_wait_ms 毫秒」或「湊滿 max_batch_size 個 window」，
+把它們疊成一個 (B, N, 6) 陣列，只呼叫一次模型，再把結果分送回各自的 Future。
+
+這樣模型的固定成本 (呼叫開銷、記憶體配置) 是「每批一次」而不是「每個請求一次」，
+同時連線的球拍越多，省下來的越多。
+
+每一批用 asyncio.create_task 送出，最多 max_in_flight 批同時在跑
+(= 推論 worker 數量)，前面的批次還在算時就繼續湊下一批，N 個 worker 都有事做。
+每個 task 自己把結果填回它那批的 Future。
+"""
+import asyncio
+import logging
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("BadmintonServer.batching")
+
+
+class InferenceBatcher:
+    """
+    run_batch: 接收 (B, N, 6) float32 陣列，回傳長度 B 的結果清單
+    max_batch_size: 一批最多幾個 window
+    max_wait_ms: 第一個 window 進來後最多等幾毫秒湊批次
+    max_in_flight: 最多幾批同時在推論 (通常 = INFERENCE_WORKERS)
+    """
+
+    def __init__(self, run_batch: Callable[[np.ndarray], Sequence],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, max_in_flight: int = 1):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+        self._slots: asyncio.Semaphore = None
+        self._in_flight = set()  # 正在推論的批次 task
+
+    async def start(self):
+        """在 event loop 裡啟動背景排程 (伺服器啟動時呼叫一次)"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.create_task(self._run(), name="inference-batcher")
+        logger.info(f"Batcher started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait_s * 1000:.1f}, max_in_flight={self.max_in_flight})")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self):
+        """停止背景排程，還在等的請求全部取消"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # 還在推論的批次也取消 (它們的 Future 在 _run_group 裡取消)
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, window: np.ndarray):
+        """送出一個 (N, 6) window，等待屬於它的推論結果"""
+        if self._task is None:
+            raise RuntimeError("InferenceBatcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((window, future))
+        return await future
+
+    async def _collect(self) -> List:
+        """等第一個 window，再在 max_wait 內盡量湊滿一批"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            # 佇列裡已經有的先直接拿，不用等
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+
+            # 連線已經斷掉 (Future 被取消) 的 window 就不用算了
+            batch = [(w, f) for w, f in batch if not f.done()]
+            if not batch:
+                continue
+
+            # 同一批裡 window 長度可能不同，依 shape 分組後各自 stack
+            groups = {}
+            for window, future in batch:
+                groups.setdefault(window.shape, []).append((window, future))
+
+            waiting = list(groups.values())
+            try:
+                while waiting:
+                    # 所有 worker 都在忙就在這裡等；等的期間新的 window 會在佇列裡累積成下一批
+                    await self._slots.acquire()
+                    task = asyncio.create_task(self._run_group(waiting.pop(0)))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+            except asyncio.CancelledError:
+                # stop()：已經從佇列拿出來、還沒送出的 window 也要取消
+                for items in waiting:
+                    for _, future in items:
+                        future.cancel()
+                raise
+
+    async def _run_group(self, items: List):
+        """推論一批 (同 shape) 並把結果填回各自的 Future"""
+        try:
+            windows = np.stack([w for w, _ in items])
+            logger.debug(f"Running batch of {len(items)} windows {windows.shape[1:]}")
+            try:
+                results = await self._dispatch(windows)
+            except asyncio.CancelledError:
+                for _, future in items:
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Batch inference failed: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    async def _dispatch(self, windows: np.ndarray):
+        result = self._run_batch(windows)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
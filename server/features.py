@@ -0,0 +1,97 @@
+"""
+球速特徵 (Speed Features) 與線性回歸模型
+
+所有運算都是 NumPy 向量化的 reduction，一次處理整批 (B, N, 6) window，
+沒有逐筆 (per-frame) 的 Python 迴圈。輸出是確定性的 (deterministic)，
+同樣的輸入永遠得到同樣的球速，方便寫單元測試。
+"""
+import json
+from typing import List, Optional
+
+import numpy as np
+
+SAMPLE_DT = 0.02  # 50 Hz
+
+# 特徵順序 (模型係數也依照這個順序)
+FEATURE_NAMES = [
+    "acc_peak",       # 加速度合力最大值
+    "gyro_peak",      # 角速度合力最大值
+    "acc_impulse",    # 加速度合力對時間積分 (梯形法)
+    "gyro_impulse",   # 角速度合力對時間積分
+    "time_to_peak",   # 從 window 開始到加速度峰值的時間 (秒)
+]
+
+
+def extract_speed_features(windows: np.ndarray, dt: float = SAMPLE_DT) -> np.ndarray:
+    """
+    輸入：(N, 6) 或 (B, N, 6) 陣列 [accX, accY, accZ, gyroX, gyroY, gyroZ]
+    輸出：(B, len(FEATURE_NAMES)) float64 特徵矩陣
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    if windows.ndim == 2:
+        windows = windows[np.newaxis]
+    if windows.ndim != 3 or windows.shape[2] != 6:
+        raise ValueError(f"expected (B, N, 6) windows, got shape {windows.shape}")
+
+    # 合力大小：sqrt(x^2 + y^2 + z^2)，整批一次算完 → (B, N)
+    acc_mag = np.sqrt(np.einsum("bnk,bnk->bn", windows[:, :, :3], windows[:, :, :3]))
+    gyro_mag = np.sqrt(np.einsum("bnk,bnk->bn", windows[:, :, 3:], windows[:, :, 3:]))
+
+    features = np.empty((len(windows), len(FEATURE_NAMES)), dtype=np.float64)
+    features[:, 0] = acc_mag.max(axis=1)
+    features[:, 1] = gyro_mag.max(axis=1)
+    features[:, 2] = _trapezoid(acc_mag, dt)
+    features[:, 3] = _trapezoid(gyro_mag, dt)
+    features[:, 4] = acc_mag.argmax(axis=1) * dt
+    return features
+
+
+def _trapezoid(values: np.ndarray, dt: float) -> np.ndarray:
+    """沿最後一軸做梯形積分 (等同 np.trapezoid，但 NumPy 1.x 也能用)"""
+    return (values.sum(axis=-1) - 0.5 * (values[..., 0] + values[..., -1])) * dt
+
+
+class LinearSpeedModel:
+    """
+    speed = features @ coef + intercept
+
+    預設係數只用到 acc_peak (每 1 單位加速度 ≈ 10 km/h)，
+    等同舊版模擬公式的平均值，但不再加隨機倍數。
+    有真實球速資料後，用 fit() 擬合並 save() 成 JSON，
+    再透過 SPEED_MODEL_PATH 環境變數載入。
+    """
+
+    def __init__(self, coef: Optional[List[float]] = None, intercept: float = 0.0):
+        if coef is None:
+            coef = [10.0, 0.0, 0.0, 0.0, 0.0]
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        if self.coef.shape != (len(FEATURE_NAMES),):
+            raise ValueError(f"expected {len(FEATURE_NAMES)} coefficients, got {self.coef.shape}")
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """(B, F) 特徵 → (B,) 球速 (km/h)，不會小於 0"""
+        return np.maximum(features @ self.coef + self.intercept, 0.0)
+
+    @classmethod
+    def fit(cls, features: np.ndarray, speeds: np.ndarray) -> "LinearSpeedModel":
+        """最小平方法擬合 (features: (B, F)，speeds: (B,) km/h)"""
+        design = np.hstack([features, np.ones((len(features), 1))])
+        solution, *_ = np.linalg.lstsq(design, np.asarray(speeds, dtype=np.float64), rcond=None)
+        return cls(solution[:-1].tolist(), float(solution[-1]))
+
+    @classmethod
+    def load(cls, path: str) -> "LinearSpeedModel":
+        with open(path, "r", encoding="utf-8") as f:
+            params = json.load(f)
+        if params.get("features", FEATURE_NAMES) != FEATURE_NAMES:
+            raise ValueError(f"feature order mismatch in {path}")
+        return cls(params["coef"], params.get("intercept", 0.0))
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "features": FEATURE_NAMES,
+                "coef": self.coef.tolist(),
+                "intercept": self.intercept,
+            }, f, indent=2)
@@ -0,0 +1,63 @@
+"""
+多 worker 部署設定 (gunicorn + uvicorn worker)
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- 每個 worker 是獨立的行程 (shared-nothing)，各自有自己的 event loop、
+  批次排程與 WebSocket 連線，一個 worker 卡住不會拖慢其他 worker。
+- preload_app：master 先 import main.py 再 fork，import 錯誤在開 worker 前就會發現，
+  Python 程式碼的記憶體分頁 fork 後以 copy-on-write 共用。
+  模型的 Interpreter 不會共用：每個 worker 在 SwingClassifier.start 裡各自重新載入
+  (含 XNNPACK 重新排列過的權重)；共用的只有 .tflite 檔本身 (mmap，OS page cache 只有一份)。
+- 推論預設在 worker 自己的執行緒跑 (INFERENCE_EXECUTOR=thread)：worker 本身就是
+  一個 core 一個行程，再各開一個推論子行程 (process) 會讓吃 CPU 的行程數變成 core 數的兩倍。
+- PIN_WORKERS=1 時，每個 worker 綁定到一個 CPU core，減少行程在 core 之間搬移。
+
+環境變數說明見 README.md。
+"""
+import os
+
+# 要在 preload (import main.py) 之前設定；明確設定的環境變數優先
+os.environ.setdefault("INFERENCE_EXECUTOR", "thread")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# WEB_CONCURRENCY: worker 數量 (Heroku 等平台會自動設定)，預設一個 core 一個 worker
+workers = int(os.environ.get("WEB_CONCURRENCY", "0")) or (os.cpu_count() or 1)
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# WebSocket 是長連線，不能用 gunicorn 預設的 30 秒請求逾時把 worker 砍掉
+timeout = int(os.environ.get("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+_CPUS = _available_cpus()
+
+
+def _pinning() -> bool:
+    return os.environ.get("PIN_WORKERS") == "1" and hasattr(os, "sched_setaffinity")
+
+
+def pre_fork(server, worker):
+    # PIN_WORKERS=1：在 master 裡選 core，挑「目前活著的 worker 用最少」的那個。
+    # 被重啟的 worker (當掉、max_requests) 已經從 server.WORKERS 移除，
+    # 所以新的 worker 會補上它空出來的 core，不會兩個 worker 擠同一個 core
+    if not _pinning():
+        return
+    used = [getattr(w, "cpu", None) for w in server.WORKERS.values()]
+    worker.cpu = min(_CPUS, key=used.count)
+
+
+def post_fork(server, worker):
+    if not _pinning():
+        return
+    os.sched_setaffinity(0, {worker.cpu})
+    server.log.info(f"Worker {worker.pid} pinned to CPU {worker.cpu}")
@@ -0,0 +1,172 @@
+"""
+推論後端 (Inference Backends)
+
+把真正的模型 (TFLite / ONNX) 包成同一個介面：predict(windows) -> 機率 (B, C)。
+模型只在啟動時載入一次；推論可以放到 ProcessPoolExecutor / ThreadPoolExecutor
+裡執行，讓 asyncio 的 event loop 不會被 CPU 密集的運算卡住。
+
+Worker 端的函式 (_init_worker / worker_predict) 必須放在模組最外層，
+因為 ProcessPoolExecutor 會用 pickle 把「函式名稱」傳到子行程執行。
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("BadmintonServer.inference")
+
+# 學長姐的模型 (examples/.../train_badminton_model.py) 輸入是 (40, 6, 1)
+# 類別順序是 LabelEncoder 排序後的 ['drive', 'other', 'smash']
+MODEL_WINDOW_SIZE = 40
+DEFAULT_MODEL_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "examples", "Past_Student_Projects", "codes", "Model", "badminton_model.tflite",
+))
+DEFAULT_MODEL_CLASSES = ["Drive", "Other", "Smash"]
+
+
+class BackendUnavailable(RuntimeError):
+    """找不到對應的推論函式庫 (例如沒安裝 tflite runtime)"""
+
+
+def fit_window_length(windows: np.ndarray, length: int = MODEL_WINDOW_SIZE) -> np.ndarray:
+    """
+    模型的輸入長度是固定的：
+    - 太長：取中間 length 筆
+    - 太短：前後用邊界值補齊
+    """
+    n = windows.shape[1]
+    if n == length:
+        return windows
+    if n > length:
+        start = (n - length) // 2
+        return windows[:, start:start + length]
+    pad_before = (length - n) // 2
+    pad_after = length - n - pad_before
+    return np.pad(windows, ((0, 0), (pad_before, pad_after), (0, 0)), mode="edge")
+
+
+class TFLiteBackend:
+    """TFLite Interpreter (依序嘗試 ai_edge_litert / tflite_runtime / tensorflow)"""
+
+    name = "tflite"
+
+    def __init__(self, model_path: str):
+        interpreter_cls = None
+        for module in ("ai_edge_litert.interpreter", "tflite_runtime.interpreter"):
+            try:
+                interpreter_cls = __import__(module, fromlist=["Interpreter"]).Interpreter
+                break
+            except ImportError:
+                continue
+        if interpreter_cls is None:
+            try:
+                import tensorflow as tf
+                interpreter_cls = tf.lite.Interpreter
+            except ImportError:
+                raise BackendUnavailable("no TFLite runtime installed")
+
+        self._interpreter = interpreter_cls(model_path=model_path)
+        self._interpreter.allocate_tensors()
+        self._input_index = self._interpreter.get_input_details()[0]["index"]
+        self._output_index = self._interpreter.get_output_details()[0]["index"]
+        self._batch_size = 1
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        x = fit_window_length(windows).astype(np.float32, copy=False)[..., np.newaxis]
+        # Interpreter 的輸入大小是固定的，batch 大小改變時才重新配置
+        if len(x) != self._batch_size:
+            self._interpreter.resize_tensor_input(self._input_index, x.shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = len(x)
+        self._interpreter.set_tensor(self._input_index, np.ascontiguousarray(x))
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output_index).copy()
+
+
+class OnnxBackend:
+    """ONNX Runtime (模型由同一個 Keras 模型用 tf2onnx 匯出)"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise BackendUnavailable("onnxruntime is not installed")
+
+        options = ort.SessionOptions()
+        # 平行度交給 worker 數量控制，每個 session 只用一條執行緒
+        options.intra_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        x = fit_window_length(windows).astype(np.float32, copy=False)[..., np.newaxis]
+        return self._session.run(None, {self._input_name: x})[0]
+
+
+def load_backend(backend: str, model_path: str):
+    """
+    backend: "tflite" / "onnx" / "auto" (依副檔名決定)
+    找不到 runtime 會丟出 BackendUnavailable
+    """
+    if backend == "auto":
+        backend = "onnx" if model_path.endswith(".onnx") else "tflite"
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(model_path)
+    if backend == "tflite":
+        return TFLiteBackend(model_path)
+    if backend == "onnx":
+        return OnnxBackend(model_path)
+    raise ValueError(f"unknown model backend: {backend}")
+
+
+# --- Worker 端 (在 executor 的每個 thread / process 裡各有一份) ---
+# TFLite Interpreter 不是 thread-safe，所以每個 worker 都有自己的實例
+
+_worker_state = threading.local()
+
+
+def _init_worker(backend: str, model_path: str):
+    if threading.current_thread() is threading.main_thread():
+        # Process worker：Ctrl-C 送給整個 process group 時交給主行程去關 pool，
+        # SIGTERM 用預設行為 (直接結束)，不要沿用 uvicorn 的 handler
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker_state.backend = load_backend(backend, model_path)
+    # 暖身：在 worker 啟動時就跑一次推論 (配置記憶體)，第一個真正的揮拍不用付這個成本
+    _worker_state.backend.predict(np.zeros((1, MODEL_WINDOW_SIZE, 6), dtype=np.float32))
+
+
+def worker_ready() -> int:
+    """空的工作：只用來讓 executor 把 worker 開起來 (worker 是 lazy 啟動的)"""
+    return os.getpid()
+
+
+def worker_predict(windows: np.ndarray) -> np.ndarray:
+    return _worker_state.backend.predict(windows)
+
+
+def create_executor(kind: str, workers: int, backend: str, model_path: str) -> Optional[Executor]:
+    """
+    kind: "process" / "thread" / "inline" (inline = 不開 executor，直接在 event loop 上算)
+
+    Process worker 用 spawn 啟動 (不是 fork)：fork 會讓子行程繼承 uvicorn 的
+    signal handler、event loop 和 socket，伺服器關掉後 worker 會變成孤兒行程。
+    """
+    if kind == "inline":
+        return None
+    if kind == "process":
+        return ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(backend, model_path),
+        )
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend, model_path))
+    raise ValueError(f"unknown executor kind: {kind}")
@@ -1,22 +1,105 @@
+import asyncio
 import logging
+import os
 import random
 import json
 import time
+from contextlib import asynccontextmanager
 from typing import List, Optional
+import numpy as np
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 
+import metrics
+
+from backpressure import OVERFLOW_POLICIES, BoundedWindowQueue
+from batching import InferenceBatcher
+from features import LinearSpeedModel, extract_speed_features
+from inference import (
+    DEFAULT_MODEL_CLASSES,
+    DEFAULT_MODEL_PATH,
+    MODEL_WINDOW_SIZE,
+    BackendUnavailable,
+    worker_predict,
+    worker_ready,
+    create_executor,
+    load_backend,
+)
+
+from protocol import (
+    BINARY_SUBPROTOCOL,
+    STREAM_SUBPROTOCOL,
+    ProtocolError,
+    decode_binary_window,
+    frames_to_window,
+)
+from sessions import SessionStore, window_digest
+from streaming import SwingDetector
+
 # --- 配置日誌 (Logging) ---
 # 設定程式的記錄層級，INFO 代表一般訊息，ERROR 代表錯誤
 # 這就像是在寫開發日記，讓我們知道程式執行到哪裡了
-logging.basicConfig(level=logging.INFO)
+# 每個 window 的紀錄是 DEBUG 等級 (高流量時寫 log 本身就很花時間)，
+# 需要逐筆追蹤時設定環境變數 LOG_LEVEL=DEBUG；平常請看 /metrics
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 # 建立一個 Logger 物件，名稱叫做 "BadmintonServer"
 logger = logging.getLogger("BadmintonServer")
 
+# --- 伺服器設定 (Config) ---
+# 可以用環境變數調整 (例如在 Render 的 Environment 頁面設定)
+# BATCH_MAX_SIZE: 一次推論最多合併幾個 window
+# BATCH_MAX_WAIT_MS: 第一個 window 進來後，最多等幾毫秒湊批次 (0 = 不等待)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+# MODEL_BACKEND: auto (找得到 runtime 就用真模型，否則退回 mock) / tflite / onnx / mock
+# MODEL_PATH: 模型檔 (.tflite 或 .onnx)，預設使用 examples 裡學長姐的模型
+# MODEL_CLASSES: 模型輸出的類別順序 (逗號分隔)
+# INFERENCE_EXECUTOR: process / thread / inline (inline = 直接在 event loop 上算)
+# INFERENCE_WORKERS: executor 的 worker 數量
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "auto")
+MODEL_PATH = os.environ.get("MODEL_PATH", DEFAULT_MODEL_PATH)
+MODEL_CLASSES = os.environ.get("MODEL_CLASSES", ",".join(DEFAULT_MODEL_CLASSES)).split(",")
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "process")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+# SPEED_MODEL_PATH: 球速線性模型係數 (JSON，由 LinearSpeedModel.save 產生)，沒設定就用預設係數
+SPEED_MODEL_PATH = os.environ.get("SPEED_MODEL_PATH") or None
+# STREAM_PEAK_THRESHOLD: 串流模式的擊球門檻 (加速度合力，單位 g)
+# STREAM_REFRACTORY_MS: 偵測到擊球後多久內不再觸發 (毫秒)
+STREAM_PEAK_THRESHOLD = float(os.environ.get("STREAM_PEAK_THRESHOLD", "3.0"))
+STREAM_REFRACTORY_MS = float(os.environ.get("STREAM_REFRACTORY_MS", "500"))
+# SESSION_TTL_S: 斷線後保留 client session (快取、校正值、歷史) 幾秒，等手機重連
+# SESSION_CACHE_SIZE: 每個 client 快取最近幾個 window 的結果 (0 = 不快取)
+# SESSION_HISTORY_SIZE: 每個 client 保留最近幾筆擊球紀錄
+SESSION_TTL_S = float(os.environ.get("SESSION_TTL_S", "300"))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "64"))
+SESSION_HISTORY_SIZE = int(os.environ.get("SESSION_HISTORY_SIZE", "100"))
+# INBOUND_QUEUE_SIZE: 每條連線最多排隊幾個等待推論的 window
+# OVERFLOW_POLICY: 佇列滿了怎麼辦 drop_oldest / coalesce / reject (見 backpressure.py)
+INBOUND_QUEUE_SIZE = int(os.environ.get("INBOUND_QUEUE_SIZE", "8"))
+OVERFLOW_POLICY = os.environ.get("OVERFLOW_POLICY", "drop_oldest")
+if OVERFLOW_POLICY not in OVERFLOW_POLICIES:
+    raise ValueError(f"OVERFLOW_POLICY must be one of {OVERFLOW_POLICIES}, got {OVERFLOW_POLICY!r}")
+
 # --- 建立 FastAPI 主程式 ---
 # FastAPI 是一個很快速、現代化的 Python 網頁框架
 # 我們用它來架設伺服器，處理手機 APP 傳來的資料
-app = FastAPI(title="Badminton Swing Recognition Server")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 伺服器啟動：開啟推論 worker 並暖身，再開啟所有連線共用的批次推論排程
+    await classifier.start()
+    await batcher.start()
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
+    session_sweeper = asyncio.create_task(sessions.expire_forever())
+    yield
+    # 伺服器關閉：停止排程
+    lag_monitor.cancel()
+    session_sweeper.cancel()
+    await batcher.stop()
+    classifier.shutdown()
+
+app = FastAPI(title="Badminton Swing Recognition Server", lifespan=lifespan)
 
 # --- 資料模型 (Data Models) ---
 # 這裡定義資料長什麼樣子，使用 Pydantic 函式庫來幫我們檢查資料格式
@@ -34,66 +117,156 @@ class SwingRequest(BaseModel):
     data: List[IMUFrame]   # 一連串的 IMU 資料點 (組合成一個動作)
 
 # --- AI 模型封裝 (Model Wrappers) ---
-# 這裡模擬載入訓練好的 AI 模型
-# 在真實專案中，這裡會使用 PyTorch (torch.load) 來載入 .pth 檔案
+# 分類模型使用 TFLite / ONNX (見 inference.py)；沒有安裝 runtime 時退回模擬模式 (Mock)
 
 class SwingClassifier:
     """
     動作分類模型 (Classifier)
     功能：判斷這個動作是「殺球」、「平抽」、「挑球」還是「切球」。
     """
-    def __init__(self):
-        # 初始化：程式啟動時會執行這裡
-        # self.model = torch.load("c:/models/classifier_v1.pth") # 真實載入方式
-        
-        # 定義我們支援的動作類別
-        self.classes = ["Smash", "Drive", "Toss", "Drop", "Other"]
-        logger.info("Loaded Classifier Model (Mock)") # 紀錄：模型載入完成
-
-    def predict(self, frames: List[IMUFrame]):
+    def __init__(self, backend: str = MODEL_BACKEND, model_path: str = MODEL_PATH):
+        # 初始化：程式啟動時會執行這裡，模型只載入這一次
+        self._backend_name = backend
+        self._model_path = model_path
+        self._model = None
+        self._executor = None
+        self._loaded_pid = os.getpid()
+        self.ready = False  # 暖身完成後才會變成 True (見 /ready)
+
+        if backend != "mock":
+            try:
+                self._model = load_backend(backend, model_path)
+            except (BackendUnavailable, FileNotFoundError) as e:
+                # 指定了 tflite/onnx 卻載不到就直接報錯；auto 則退回 mock
+                if backend != "auto":
+                    raise
+                logger.warning(f"Classifier model unavailable ({e}), using mock")
+
+        if self._model is not None:
+            # 真實模型：類別順序要和訓練時一致
+            self.classes = MODEL_CLASSES
+            logger.info(f"Loaded Classifier Model ({self._model.name}: {model_path})")
+        else:
+            # 定義模擬模式支援的動作類別
+            self.classes = ["Smash", "Drive", "Toss", "Drop", "Other"]
+            logger.info("Loaded Classifier Model (Mock)") # 紀錄：模型載入完成
+
+    async def start(self, executor_kind: str = INFERENCE_EXECUTOR, workers: int = INFERENCE_WORKERS):
+        """
+        啟動推論 worker 並暖身 (warm-up)
+        先用全 0 的資料跑一次，讓每個 worker 把模型載入、配置好記憶體，
+        第一個真正的揮拍就不用付這個成本
+        """
+        if self._model is None:
+            self.ready = True
+            return
+        if os.getpid() != self._loaded_pid:
+            # 多 worker 部署 (gunicorn preload) 時，模型是在 master 載入後 fork 過來的；
+            # Interpreter 內部的執行緒不會跟著 fork，所以在 worker 裡重新建立一份
+            # (每個 worker 各有自己的 Interpreter 記憶體)。共用的只有 .tflite 檔本身：
+            # 它是 mmap 進來的，OS page cache 裡只有一份
+            self._model = load_backend(self._model.name, self._model_path)
+            self._loaded_pid = os.getpid()
+        self._executor = create_executor(
+            executor_kind, workers, self._model.name, self._model_path
+        )
+        if self._executor is None:
+            self._model.predict(np.zeros((1, MODEL_WINDOW_SIZE, 6), dtype=np.float32))
+        else:
+            # 每個 worker 在 _init_worker 裡自己暖身；executor 只在沒有閒置 worker 時
+            # 才開新的，所以同時送出 workers 個空工作，讓所有 worker 在接流量前就啟動
+            loop = asyncio.get_running_loop()
+            pids = await asyncio.gather(*[
+                loop.run_in_executor(self._executor, worker_ready) for _ in range(workers)
+            ])
+            logger.info(f"Inference workers started: {sorted(set(pids))}")
+        logger.info(f"Classifier warmed up ({executor_kind}, workers={workers})")
+        self.ready = True
+
+    @property
+    def backend_name(self) -> str:
+        return self._model.name if self._model is not None else "mock"
+
+    def shutdown(self):
+        self.ready = False
+        if self._executor is not None:
+            # 等 worker 結束 (回收子行程)，還沒開始的推論直接取消
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def predict(self, window: np.ndarray):
         """
         推論 (Predict) 函式
-        輸入：一連串的 IMU 資料 (frames)
+        輸入：(N, 6) float32 陣列 [accX, accY, accZ, gyroX, gyroY, gyroZ]
         輸出：預測的動作名稱 (predicted_class) 和信心度 (confidence)
         """
-        # 這裡應該要寫真實的 AI 推論程式碼...
-        
+        classes, confidences = self.predict_batch(window[np.newaxis])
+        return classes[0], float(confidences[0])
+
+    def predict_batch(self, windows: np.ndarray):
+        """
+        批次推論：一次處理 B 個 window
+        輸入：(B, N, 6) float32 陣列
+        輸出：B 個動作名稱 (list) 和 B 個信心度 (np.ndarray)
+        """
+        if self._model is not None:
+            return self._decode(self._model.predict(windows))
+
         # (模擬行為 Mock)
         # 隨機選一個動作，假設殺球 (Smash) 機率最高 (0.3)
-        predicted_class = random.choices(
-            self.classes, weights=[0.3, 0.2, 0.2, 0.2, 0.1], k=1
-        )[0]
+        batch_size = len(windows)
+        predicted_classes = random.choices(
+            self.classes, weights=[0.3, 0.2, 0.2, 0.2, 0.1], k=batch_size
+        )
         # 隨機產生一個信心度 (0.7 ~ 0.99 之間)
-        confidence = random.uniform(0.7, 0.99)
-        return predicted_class, confidence
+        confidences = np.random.uniform(0.7, 0.99, size=batch_size)
+        return predicted_classes, confidences
+
+    async def predict_batch_async(self, windows: np.ndarray):
+        """
+        和 predict_batch 相同，但把模型運算丟到 executor 裡執行，
+        event loop 在等待期間可以繼續收其他連線的資料
+        """
+        if self._executor is None:
+            return self.predict_batch(windows)
+        loop = asyncio.get_running_loop()
+        probs = await loop.run_in_executor(self._executor, worker_predict, windows)
+        return self._decode(probs)
+
+    def _decode(self, probs: np.ndarray):
+        """模型輸出的機率 (B, C) → 類別名稱與信心度"""
+        best = probs.argmax(axis=1)
+        return [self.classes[i] for i in best], probs[np.arange(len(probs)), best]
 
 class SpeedRegressor:
     """
     球速預測模型 (Regressor)
     功能：如果動作是「殺球」，就進一步預測球速幾公里。
     """
-    def __init__(self):
-        # self.model = torch.load("c:/models/speed_regressor_v1.pth")
-        logger.info("Loaded Speed Model (Mock)")
+    def __init__(self, model_path: Optional[str] = SPEED_MODEL_PATH):
+        # 特徵 (峰值、積分、到達峰值時間) → 線性模型，見 features.py
+        if model_path:
+            self._model = LinearSpeedModel.load(model_path)
+            logger.info(f"Loaded Speed Model ({model_path})")
+        else:
+            self._model = LinearSpeedModel()
+            logger.info("Loaded Speed Model (default coefficients)")
 
-    def predict(self, frames: List[IMUFrame]):
+    def predict(self, window: np.ndarray):
         """
-        輸入：一連串的 IMU 資料
+        輸入：(N, 6) float32 陣列
         輸出：預測的球速 (float)
         """
-        # (模擬行為)
-        # 這裡用一個簡單的物理公式來假裝算球速：加速度越快，球速越快
-        # 先找出這一連串資料中，加速度最大值 (Max Magnitude)
-        max_acc = 0
-        for f in frames:
-            # 算出合力大小：sqrt(x^2 + y^2 + z^2)
-            mag = (f.acc[0]**2 + f.acc[1]**2 + f.acc[2]**2) ** 0.5
-            if mag > max_acc:
-                max_acc = mag
-        
-        # 隨機乘上一個倍數，讓球速看起來合理 (例如 150 ~ 250 km/h)
-        speed = max_acc * random.uniform(8, 12) 
-        return round(speed, 1) # 四雪五入到小數下一位
+        return self.predict_batch(window[np.newaxis])[0]
+
+    def predict_batch(self, windows: np.ndarray):
+        """
+        輸入：(B, N, 6) float32 陣列
+        輸出：B 個球速 (list of float)
+        """
+        # 整批一次抽特徵、一次矩陣乘法，沒有逐筆的 Python 迴圈
+        speeds = self._model.predict(extract_speed_features(windows))
+        return [round(float(v), 1) for v in speeds] # 四雪五入到小數下一位
 
 # --- 程式啟動初始化 ---
 # 這裡一次把兩個模型載入到記憶體 (RAM) 中
@@ -106,83 +279,262 @@ except Exception as e:
     logger.error(f"Failed to load models: {e}")
     raise e
 
+# --- 推論流程 (Inference Pipeline) ---
+# JSON 與 Binary 兩種格式解碼後都會走到這裡，所以推論邏輯只需要寫一次
+
+# 信心門檻：只有信心度 > 0.6 我們才把它當真
+CONFIDENCE_THRESHOLD = 0.6
+
+async def infer_batch(windows: np.ndarray) -> list:
+    """
+    批次推論 (由 InferenceBatcher 呼叫)
+    輸入：(B, N, 6) float32 陣列
+    輸出：B 個 (action_type, confidence, speed)，不是殺球的 speed 為 None
+    """
+    metrics.BATCH_SIZE.observe(len(windows))
+
+    # 呼叫分類器，一次猜完整批是什麼動作
+    with metrics.STAGE_SECONDS.time("classify"):
+        action_types, confidences = await classifier.predict_batch_async(windows)
+
+    # 只有「信心足夠的殺球」才需要算球速，挑出來一起算
+    smash_idx = [
+        i for i, (t, c) in enumerate(zip(action_types, confidences))
+        if t == "Smash" and c > CONFIDENCE_THRESHOLD
+    ]
+    speeds = [None] * len(windows)
+    if smash_idx:
+        with metrics.STAGE_SECONDS.time("regress"):
+            smash_speeds = speed_model.predict_batch(windows[smash_idx])
+        for i, speed in zip(smash_idx, smash_speeds):
+            speeds[i] = speed
+
+    return [
+        (action_types[i], float(confidences[i]), speeds[i])
+        for i in range(len(windows))
+    ]
+
+# 所有連線共用的批次推論排程 (在 lifespan 裡啟動)
+# inline 模式在 event loop 上算，同時只能跑一批；否則每個推論 worker 各跑一批
+batcher = InferenceBatcher(
+    infer_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_in_flight=1 if INFERENCE_EXECUTOR == "inline" else INFERENCE_WORKERS,
+)
+
+# 每個 client_id 的 session (斷線重連後接回同一個，見 sessions.py)
+sessions = SessionStore(
+    ttl_s=SESSION_TTL_S, cache_size=SESSION_CACHE_SIZE, history_size=SESSION_HISTORY_SIZE
+)
+
+def build_response(timestamp: float, action_type: str, confidence: float,
+                   speed: Optional[float]) -> dict:
+    """
+    輸入：最後一筆資料的時間戳記 (秒) 與 infer_batch 的推論結果
+    輸出：要回傳給手機的結果 (dict)
+    """
+    # 先填好基本資料
+    response = {
+        "timestamp": timestamp,      # 使用最後一筆資料的時間戳記
+        "type": action_type,         # 動作類型 (Smash, Drive...)
+        "confidence": round(confidence, 2), # 信心度
+        "speed": None,    # 預設沒有球速
+        "display": False, # 預設不顯示 (除非信心足夠)
+        "message": ""     # 給使用者看的訊息
+    }
+
+    # 設定信心門檻：只有信心度 > 0.6 我們才把它當真
+    if confidence > CONFIDENCE_THRESHOLD:
+        response["display"] = True # 告訴 APP：請顯示這個結果
+
+        # 只有殺球 (Smash) 才有球速
+        if action_type == "Smash":
+            response["speed"] = speed
+            response["message"] = f"Smash! {speed} km/h"
+            logger.debug(f"SMASH: {speed} km/h")
+        else:
+            # 其他球路只顯示名稱
+            response["message"] = f"{action_type}"
+            logger.debug(f"Detected: {action_type}")
+    else:
+        # 信心不足，當作沒發生或雜訊
+        response["display"] = False
+        response["message"] = "Low confidence"
+
+    return response
+
+def decode_json_window(payload: dict):
+    """
+    JSON 格式：把 dict 轉成 (window, timestamps)
+    - window: (N, 6) float32，timestamps: (N,) 秒
+    資料是空的就回傳 None
+    """
+    raw_frames = payload.get("data", [])
+    if not raw_frames:
+        return None
+
+    # 將原始字典資料轉換成我們定義好的 IMUFrame 物件 (順便檢查格式)
+    with metrics.STAGE_SECONDS.time("validate"):
+        frames = [
+            IMUFrame(ts=f["ts"], acc=f["acc"], gyro=f["gyro"])
+            for f in raw_frames
+        ]
+        window = frames_to_window(frames)
+        if window.ndim != 2 or window.shape[1] != 6:
+            raise ProtocolError(f"expected 3-axis acc and gyro, got shape {window.shape}")
+        return window, np.array([f.ts for f in frames], dtype=np.float64)
+
+def new_detector() -> SwingDetector:
+    """串流模式：建立一個新的揮拍偵測器 (每條連線一個)"""
+    return SwingDetector(threshold=STREAM_PEAK_THRESHOLD, refractory_ms=STREAM_REFRACTORY_MS)
+
+def decode_message(message: dict):
+    """
+    把一則 WebSocket 訊息解碼成 (samples, timestamps)
+    文字訊息回傳 payload dict 讓呼叫端處理協商 (hello)；空資料回傳 None
+    """
+    if message.get("bytes") is not None:
+        # Binary：30 bytes 一筆，一次 frombuffer 解完
+        metrics.MESSAGES_RECEIVED.inc(1, "binary")
+        with metrics.STAGE_SECONDS.time("decode"):
+            samples, ts_ms = decode_binary_window(message["bytes"])
+            return samples, ts_ms.astype(np.float64) / 1000.0
+    # 使用 json 模組把文字轉成 Python 字典 (Dictionary)
+    metrics.MESSAGES_RECEIVED.inc(1, "json")
+    with metrics.STAGE_SECONDS.time("decode"):
+        return json.loads(message["text"])
+
 # --- WebSocket 路由 (Endpoint) ---
 # 定義一個網址：wss://你的網址/ws/predict
 # 手機 APP 會連線到這個網址來傳送資料
+# 傳輸格式 (JSON / Binary) 與模式 (一次一個 window / 串流) 的說明請看 protocol.py
+
+async def process_windows(queue: BoundedWindowQueue, send_json):
+    """
+    處理 task：從連線的佇列拿 window → 推論 → 回傳結果
+    和接收 task 同時執行，推論再慢也不會卡住 socket 的讀取
+    """
+    while True:
+        window, timestamp, session = await queue.get()
+
+        # 重連後重送的 window：直接回傳上次的結果，不用再推論
+        digest = window_digest(window, timestamp)
+        response = session.lookup(digest)
+        if response is not None:
+            metrics.CACHE_HITS.inc()
+        else:
+            # 2. 執行 AI 推論 (Inference)
+            # 交給共用的批次排程，和其他連線的 window 一起算，這裡只等自己的結果
+            # (inference 包含排隊等批次的時間，classify / regress 是模型本身)
+            with metrics.STAGE_SECONDS.time("inference"):
+                result = await batcher.submit(session.calibrate(window))
+
+            # 3. 準備回傳結果 (Response)
+            response = build_response(timestamp, *result)
+            session.remember(digest, response)
+            session.record(response)
+
+        # 4. 將結果回傳給手機
+        with metrics.STAGE_SECONDS.time("send"):
+            await send_json(response)
 
 @app.websocket("/ws/predict")
 async def websocket_endpoint(websocket: WebSocket):
-    # 當有手機連上來時，先接受連線
-    await websocket.accept()
-    logger.info("Client connected") # 紀錄：有人連線了
-    
+    # 協商格式：如果 client 要求 binary / stream subprotocol，就在 accept 時確認
+    requested = websocket.scope.get("subprotocols", [])
+    if STREAM_SUBPROTOCOL in requested:
+        mode, subprotocol = "stream", STREAM_SUBPROTOCOL
+    elif BINARY_SUBPROTOCOL in requested:
+        mode, subprotocol = "binary", BINARY_SUBPROTOCOL
+    else:
+        mode, subprotocol = "json", None
+    await websocket.accept(subprotocol=subprotocol)
+    client_id = websocket.query_params.get("client_id", "unknown")
+    logger.info(f"Client connected (mode={mode})") # 紀錄：有人連線了
+    metrics.ACTIVE_CONNECTIONS.inc()
+    session = sessions.attach(client_id)
+
+    # 串流模式：每條連線一個揮拍偵測器 (內含環狀緩衝區)
+    detector = new_detector() if mode == "stream" else None
+
+    # 接收與處理是兩個 task，都會送訊息給手機，用 lock 確保一次只有一個在送
+    send_lock = asyncio.Lock()
+
+    async def send_json(obj: dict):
+        # json.dumps 把字典轉回 JSON 文字字串
+        async with send_lock:
+            await websocket.send_text(json.dumps(obj))
+
+    # 等待推論的 window 排在這裡 (有上限，見 backpressure.py)
+    queue = BoundedWindowQueue(INBOUND_QUEUE_SIZE, OVERFLOW_POLICY)
+    processor = asyncio.create_task(process_windows(queue, send_json))
+
     try:
         # 使用無窮迴圈 (while True) 來持續接收資料
         # 只要連線沒斷，就會一直跑要在這裡
         while True:
-            # 1. 等待並接收手機傳來的文字資料 (receive_text)
+            # 1. 等待並接收手機傳來的資料 (文字或二進位都可以)
             # await 代表「等待」，在等待期間伺服器可以去處理別人的請求 (非同步)
-            data = await websocket.receive_text()
-            
-            # 使用 json 模組把文字轉成 Python 字典 (Dictionary)
-            payload = json.loads(data)
-            
-            # 從字典中取出資料
-            # .get("key", default) 的寫法是：如果找不到這個 key，就給預設值
-            client_id = payload.get("client_id", "unknown")
-            raw_frames = payload.get("data", [])
-            
-            # 如果資料是空的，就跳過這次迴圈，繼續等下一筆
-            if not raw_frames:
-                continue
+            with metrics.STAGE_SECONDS.time("receive"):
+                message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if processor.done():
+                # 處理 task 出錯結束了 (例如推論失敗)，把錯誤丟出來
+                processor.result()
 
-            logger.info(f"Received {len(raw_frames)} frames from {client_id}")
+            try:
+                decoded = decode_message(message)
+                if isinstance(decoded, dict):
+                    payload = decoded
+                    if payload.get("client_id", client_id) != client_id:
+                        # 換了 client_id：改接到那個球員的 session
+                        sessions.detach(session)
+                        client_id = payload["client_id"]
+                        session = sessions.attach(client_id)
 
-            # 將原始字典資料轉換成我們定義好的 IMUFrame 物件
-            # 這樣操作起來比較方便 (可以使用 frames[0].acc 這樣存取)
-            frames = [
-                IMUFrame(ts=f["ts"], acc=f["acc"], gyro=f["gyro"]) 
-                for f in raw_frames
-            ]
+                    # 設定校正值：{"calibration": {"acc_bias": [x, y, z], "gyro_bias": [x, y, z]}}
+                    if "calibration" in payload and "data" not in payload:
+                        calibration = payload["calibration"]
+                        session.set_calibration(calibration["acc_bias"], calibration["gyro_bias"])
+                        await send_json({"type": "calibration", "ok": True})
+                        continue
 
-            # 2. 執行 AI 推論 (Inference)
-            # 呼叫分類器，猜它是什麼動作
-            action_type, confidence = classifier.predict(frames)
-            
-            # 3. 準備回傳結果 (Response)
-            # 先填好基本資料
-            response = {
-                "timestamp": frames[-1].ts,  # 使用最後一筆資料的時間戳記
-                "type": action_type,         # 動作類型 (Smash, Drive...)
-                "confidence": round(confidence, 2), # 信心度
-                "speed": None,    # 預設沒有球速
-                "display": False, # 預設不顯示 (除非信心足夠)
-                "message": ""     # 給使用者看的訊息
-            }
-
-            # 設定信心門檻：只有信心度 > 0.6 我們才把它當真
-            if confidence > 0.6:
-                response["display"] = True # 告訴 APP：請顯示這個結果
-                
-                # 只有殺球 (Smash) 才去計算球速
-                if action_type == "Smash":
-                    speed = speed_model.predict(frames)
-                    response["speed"] = speed
-                    response["message"] = f"Smash! {speed} km/h"
-                    logger.info(f"SMASH: {speed} km/h")
-                else:
-                    # 其他球路只顯示名稱
-                    response["message"] = f"{action_type}"
-                    logger.info(f"Detected: {action_type}")
+                    # 第一則訊息協商：{"mode": "binary" / "stream"}
+                    if payload.get("mode") in ("binary", "stream") and "data" not in payload:
+                        mode = payload["mode"]
+                        if mode == "stream" and detector is None:
+                            detector = new_detector()
+                        logger.info(f"{client_id} switched to {mode} mode")
+                        await send_json({"type": "hello", "mode": mode})
+                        continue
+
+                    decoded = decode_json_window(payload)
+                    # 如果資料是空的，就跳過這次迴圈，繼續等下一筆
+                    if decoded is None:
+                        continue
+                samples, timestamps = decoded
+            except (ProtocolError, ValueError, KeyError, TypeError) as e:
+                # 格式錯誤：回報給手機，但不斷線
+                logger.warning(f"Bad payload from {client_id}: {e}")
+                metrics.PAYLOAD_ERRORS.inc()
+                await send_json({"error": str(e)})
+                continue
+
+            logger.debug(f"Received {len(samples)} frames from {client_id}")
+
+            if detector is not None:
+                # 串流模式：只有偵測到擊球的 window 才送去推論
+                swings = detector.push(samples, timestamps)
             else:
-                # 信心不足，當作沒發生或雜訊
-                response["display"] = False
-                response["message"] = "Low confidence"
-
-            # 4. 將結果回傳給手機
-            # json.dumps 把字典轉回 JSON 文字字串
-            await websocket.send_text(json.dumps(response))
-            
+                # 一般模式：整包就是一個 window，使用最後一筆資料的時間戳記
+                swings = [(samples, float(timestamps[-1]))]
+
+            for window, timestamp in swings:
+                metrics.WINDOWS_RECEIVED.inc(1, mode)
+                if not queue.put((window, timestamp, session)):
+                    # 佇列滿了 (reject policy)：告訴手機這個 window 沒被處理
+                    await send_json({"type": "overloaded", "timestamp": timestamp})
+
     except WebSocketDisconnect:
         # 手機斷線了 (例如使用者關掉 APP)
         logger.info("Client disconnected")
@@ -190,6 +542,10 @@ async def websocket_endpoint(websocket: WebSocket):
         # 發生未預期的錯誤
         logger.error(f"Error: {e}")
         await websocket.close() # 關閉連線
+    finally:
+        processor.cancel()
+        metrics.ACTIVE_CONNECTIONS.dec()
+        sessions.detach(session)
 
 # --- 健康檢查 API ---
 # 可以用瀏覽器打開 http://localhost:8000/ 確認伺服器有沒有活著
@@ -197,6 +553,21 @@ async def websocket_endpoint(websocket: WebSocket):
 def health_check():
     return {"status": "ok", "version": "v3.0"}
 
+# --- 就緒檢查 API (Readiness) ---
+# 和 health_check 不同：只有模型暖身完成、批次排程在跑的時候才回 200，
+# 給負載平衡器 / 部署平台判斷這個 worker 能不能開始接流量
+@app.get("/ready")
+def readiness_check():
+    if not (classifier.ready and batcher.running):
+        return JSONResponse({"status": "starting", "pid": os.getpid()}, status_code=503)
+    return {"status": "ready", "pid": os.getpid(), "backend": classifier.backend_name}
+
+# --- 監控指標 (Prometheus) ---
+# 連線數、window 數、各階段延遲、批次大小、event loop 延遲，說明見 metrics.py
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
+
 # --- 程式進入點 ---
 if __name__ == "__main__":
     import uvicorn
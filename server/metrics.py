@@ -0,0 +1,166 @@
+"""
+Prometheus 格式的監控指標 (Metrics)
+
+GET /metrics 會輸出 Prometheus text exposition format，
+可以直接讓 Prometheus / Grafana Agent 來抓 (scrape)。
+
+為了不增加套件依賴，這裡只實作用得到的三種型別：
+Counter (只會增加)、Gauge (可增可減)、Histogram (分桶統計延遲)。
+所有指標只在 event loop 的執行緒裡更新，所以不需要 lock。
+指標存在行程自己的記憶體裡：gunicorn 多 worker 時，每次抓到的是接到請求的那個 worker 的數字。
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+# 延遲用的分桶 (秒)：100us ~ 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, *labels: str):
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels: str):
+        self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每組 label → [各桶計數..., +Inf 計數], 總和
+        self._counts: Dict[Tuple[str, ...], list] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """with STAGE_SECONDS.time("decode"): ... 量測區塊執行時間"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self):
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts[key]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}"
+
+
+REGISTRY = []
+
+
+def render_latest() -> str:
+    """輸出所有指標 (Prometheus text format 0.0.4)"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- 伺服器使用的指標 ---
+
+ACTIVE_CONNECTIONS = Gauge(
+    "badminton_active_connections", "Number of open /ws/predict connections")
+MESSAGES_RECEIVED = Counter(
+    "badminton_messages_received_total", "WebSocket messages received, by payload format", ["format"])
+WINDOWS_RECEIVED = Counter(
+    "badminton_windows_received_total", "Windows submitted for inference, by connection mode", ["mode"])
+PAYLOAD_ERRORS = Counter(
+    "badminton_payload_errors_total", "Messages rejected because of malformed payloads")
+STAGE_SECONDS = Histogram(
+    "badminton_stage_seconds",
+    "Time spent per pipeline stage (receive includes time waiting for the client)", ["stage"])
+BATCH_SIZE = Histogram(
+    "badminton_batch_size", "Number of windows per inference batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+WINDOWS_DROPPED = Counter(
+    "badminton_windows_dropped_total", "Windows discarded because a connection's queue was full, by policy",
+    ["policy"])
+WINDOWS_COALESCED = Counter(
+    "badminton_windows_coalesced_total", "Queued windows superseded by a newer window (coalesce policy)")
+SESSIONS = Gauge(
+    "badminton_sessions", "Client sessions kept in memory (connected or within TTL)")
+CACHE_HITS = Counter(
+    "badminton_cache_hits_total", "Windows answered from the per-client result cache")
+EVENT_LOOP_LAG = Histogram(
+    "badminton_event_loop_lag_seconds", "Delay between a scheduled event loop wake-up and when it ran")
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """
+    背景 task：每 interval 秒醒來一次，實際醒來的時間比預定晚多少就是 event loop 延遲。
+    延遲變大代表有東西卡住了 event loop (例如在 loop 上做了 CPU 運算)。
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - expected, 0.0))
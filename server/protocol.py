@@ -0,0 +1,106 @@
+"""
+WebSocket 傳輸格式 (Wire Protocol)
+
+/ws/predict 支援兩種資料格式：
+
+1. JSON (預設，舊版相容)：
+   {"client_id": "...", "data": [{"ts": 1.23, "acc": [x, y, z], "gyro": [x, y, z]}, ...]}
+
+2. Binary (二進位)：
+   直接沿用韌體 BLE 封包的 30 bytes 格式 (little-endian, `<I6fH`)，
+   把 N 筆封包頭尾相接成一個 WebSocket binary message 送出：
+
+   | offset | 型別      | 欄位                         |
+   |--------|-----------|------------------------------|
+   | 0-3    | uint32    | timestamp (ms, 韌體 millis()) |
+   | 4-15   | float32*3 | accX, accY, accZ             |
+   | 16-27  | float32*3 | gyroX, gyroY, gyroZ          |
+   | 28-29  | uint16    | voltage (raw)                |
+
+   啟用方式 (擇一)：
+   - 連線時帶 WebSocket subprotocol `imu-binary-v1`
+   - 連線後第一則文字訊息送 {"mode": "binary", "client_id": "..."}
+     伺服器會回 {"type": "hello", "mode": "binary"} 作為確認
+
+不論哪種格式，伺服器內部都統一轉成 (N, 6) float32 的 NumPy 陣列
+[accX, accY, accZ, gyroX, gyroY, gyroZ]，回傳結果一律是 JSON 文字。
+
+串流模式 (Streaming)：
+   手機不切 window，直接把連續資料分成小段 (例如每 100ms 一段) 送上來，
+   每段可以是 JSON ({"data": [...]}) 或 binary 格式。
+   伺服器自己偵測揮拍 (見 streaming.py)，只有偵測到擊球時才回傳結果，
+   所以串流模式的 client 不能「送一則、等一則」。
+
+   啟用方式 (擇一)：
+   - 連線時帶 WebSocket subprotocol `imu-stream-v1`
+   - 連線後第一則文字訊息送 {"mode": "stream", "client_id": "..."}
+     伺服器會回 {"type": "hello", "mode": "stream"} 作為確認
+
+校正值 (Calibration)：
+   任何模式都可以送 {"client_id": "...", "calibration": {"acc_bias": [x, y, z], "gyro_bias": [x, y, z]}}，
+   伺服器回 {"type": "calibration", "ok": true}，之後這個 client_id 的資料推論前會先扣掉偏移量。
+   校正值跟著 client_id 的 session 保存 (見 sessions.py)，斷線重連不用再送一次。
+
+流量控制 (Backpressure)：
+   每條連線等待推論的 window 有上限 (INBOUND_QUEUE_SIZE)，送太快時多的 window 會被丟掉；
+   OVERFLOW_POLICY=reject 時伺服器會回 {"type": "overloaded", "timestamp": ...} (見 backpressure.py)。
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+BINARY_SUBPROTOCOL = "imu-binary-v1"
+STREAM_SUBPROTOCOL = "imu-stream-v1"
+
+# 一筆封包的結構 (與 src/main_v2/main_v2.ino 的 buffer[30] 相同)
+# NumPy 的 structured dtype 預設不補齊 (packed)，itemsize 剛好是 30
+IMU_RECORD_DTYPE = np.dtype([
+    ("ts", "<u4"),
+    ("imu", "<f4", (6,)),
+    ("voltage", "<u2"),
+])
+IMU_RECORD_SIZE = IMU_RECORD_DTYPE.itemsize  # 30 bytes
+
+assert IMU_RECORD_SIZE == 30
+
+
+class ProtocolError(ValueError):
+    """資料格式錯誤 (例如 binary 長度不是 30 的倍數)"""
+
+
+def decode_binary_window(payload: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把一整包 binary message 解碼成 (window, timestamps)
+    - window: (N, 6) float32，連續記憶體 (C-contiguous)
+    - timestamps: (N,) uint32，單位 ms
+    只呼叫一次 np.frombuffer，不會逐筆用 Python 迴圈解析。
+    """
+    if not payload:
+        raise ProtocolError("empty binary payload")
+    if len(payload) % IMU_RECORD_SIZE != 0:
+        raise ProtocolError(
+            f"binary payload length {len(payload)} is not a multiple of {IMU_RECORD_SIZE}"
+        )
+
+    records = np.frombuffer(payload, dtype=IMU_RECORD_DTYPE)
+    # records["imu"] 是跨步 (strided) 的 view，複製一次成連續陣列方便後續運算
+    window = np.ascontiguousarray(records["imu"], dtype=np.float32)
+    return window, records["ts"]
+
+
+def encode_binary_window(window: np.ndarray, timestamps_ms, voltage: int = 0) -> bytes:
+    """
+    decode_binary_window 的反向操作 (給模擬器/測試工具使用)
+    window: (N, 6)，timestamps_ms: 長度 N 的 ms 時間戳記
+    """
+    window = np.asarray(window, dtype=np.float32)
+    records = np.empty(len(window), dtype=IMU_RECORD_DTYPE)
+    records["ts"] = np.asarray(timestamps_ms, dtype=np.uint32)
+    records["imu"] = window
+    records["voltage"] = voltage
+    return records.tobytes()
+
+
+def frames_to_window(frames: List) -> np.ndarray:
+    """把 JSON 路徑的 IMUFrame 清單轉成 (N, 6) float32 陣列"""
+    return np.array([f.acc + f.gyro for f in frames], dtype=np.float32)
@@ -0,0 +1,147 @@
+"""
+每個球員 (client_id) 的連線狀態 (Client Sessions)
+
+手機斷線重連後常常會把同一個 window 再送一次，
+如果每次都重新推論就是白做工。這裡幫每個 client_id 保留一個 ClientSession：
+
+1. 結果快取 (LRU)：window 內容的 hash → 當時回傳的 response，
+   重送的 window 直接回傳快取，不用再排隊推論
+2. 校正值 (calibration)：這支球拍感測器的零點偏移，推論前先扣掉
+3. 歷史紀錄 (history)：最近幾次擊球結果，之後做個人化模型可以直接拿來用
+
+斷線後 session 不會馬上刪掉，保留 ttl 秒讓手機重連時接回去；
+超過 ttl 沒有任何連線的 session 會被 SessionStore.expire() 清掉。
+所有操作都在 event loop 的執行緒裡，所以不需要 lock。
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger("BadmintonServer.sessions")
+
+
+def window_digest(window: np.ndarray, timestamp: float) -> bytes:
+    """window 內容 + 時間戳記的 hash (同一個 window 重送時會一模一樣)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(window, dtype=np.float32).data)
+    h.update(np.float64(timestamp).tobytes())
+    return h.digest()
+
+
+class ClientSession:
+    """
+    cache_size: 最多快取幾個 window 的結果
+    history_size: 最多保留幾筆擊球紀錄
+    """
+
+    def __init__(self, client_id: Optional[str], cache_size: int = 64, history_size: int = 100):
+        self.client_id = client_id
+        self.cache_size = max(0, int(cache_size))
+        self._cache: "OrderedDict[bytes, dict]" = OrderedDict()
+        self.history = deque(maxlen=max(1, int(history_size)))
+        self.calibration: Optional[np.ndarray] = None  # (6,) 零點偏移
+        self.connections = 0
+        self.last_seen = time.monotonic()
+
+    # --- 結果快取 ---
+
+    def lookup(self, digest: bytes) -> Optional[dict]:
+        response = self._cache.get(digest)
+        if response is not None:
+            self._cache.move_to_end(digest)
+        return response
+
+    def remember(self, digest: bytes, response: dict):
+        if self.cache_size == 0:
+            return
+        self._cache[digest] = response
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # --- 校正值與歷史紀錄 ---
+
+    def set_calibration(self, acc_bias, gyro_bias):
+        """設定感測器零點偏移 (各 3 軸)；校正值改變後舊的快取結果就不能用了"""
+        offset = np.asarray(list(acc_bias) + list(gyro_bias), dtype=np.float32)
+        if offset.shape != (6,):
+            raise ValueError("calibration needs 3 acc_bias and 3 gyro_bias values")
+        self.calibration = offset
+        self._cache.clear()
+
+    def calibrate(self, samples: np.ndarray) -> np.ndarray:
+        if self.calibration is None:
+            return samples
+        return samples - self.calibration
+
+    def record(self, response: dict):
+        """只記錄有顯示給使用者的擊球 (信心不足的不算)"""
+        if response.get("display"):
+            self.history.append(response)
+
+
+class SessionStore:
+    """
+    client_id → ClientSession
+    ttl_s: 最後一條連線斷掉後，session 保留幾秒
+    """
+
+    def __init__(self, ttl_s: float = 300.0, cache_size: int = 64, history_size: int = 100):
+        self.ttl_s = float(ttl_s)
+        self.cache_size = cache_size
+        self.history_size = history_size
+        self._sessions: Dict[str, ClientSession] = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def attach(self, client_id: Optional[str]) -> ClientSession:
+        """
+        連線開始使用某個 client_id 時呼叫
+        沒有 client_id (例如 binary 模式沒送 hello) 的連線拿到一個不共用的暫時 session
+        """
+        if not client_id or client_id == "unknown":
+            session = ClientSession(None, self.cache_size, self.history_size)
+        else:
+            session = self._sessions.get(client_id)
+            if session is None:
+                session = ClientSession(client_id, self.cache_size, self.history_size)
+                self._sessions[client_id] = session
+                metrics.SESSIONS.set(len(self._sessions))
+            else:
+                logger.debug(f"Resumed session {client_id}")
+        session.connections += 1
+        session.last_seen = time.monotonic()
+        return session
+
+    def detach(self, session: ClientSession):
+        """連線結束 (或改用別的 client_id) 時呼叫，開始計算 ttl"""
+        session.connections = max(session.connections - 1, 0)
+        session.last_seen = time.monotonic()
+
+    def expire(self) -> int:
+        """刪掉超過 ttl 沒有連線的 session，回傳刪了幾個"""
+        cutoff = time.monotonic() - self.ttl_s
+        stale = [
+            cid for cid, s in self._sessions.items()
+            if s.connections == 0 and s.last_seen < cutoff
+        ]
+        for cid in stale:
+            del self._sessions[cid]
+        if stale:
+            metrics.SESSIONS.set(len(self._sessions))
+            logger.debug(f"Expired {len(stale)} sessions")
+        return len(stale)
+
+    async def expire_forever(self, interval: float = 30.0):
+        """背景 task：定期清掉過期的 session"""
+        while True:
+            await asyncio.sleep(interval)
+            self.expire()
@@ -0,0 +1,103 @@
+"""
+串流揮拍偵測 (Streaming Swing Detector)
+
+串流模式下，手機不用自己切 40 筆的 window，而是把連續的 50 Hz 資料
+一小段一小段 (chunk) 推上來。每條連線有一個 SwingDetector：
+
+1. 環狀緩衝區 (ring buffer) 只保留最近一段資料，記憶體用量固定
+2. 線上 (online) 峰值偵測：加速度合力超過門檻後開始追蹤最大值，
+   最大值之後再收滿 post 筆都沒有更大的值，就確定是一次擊球
+3. 以峰值為中心切出 pre + 1 + post 筆的 window 交給模型推論
+4. 擊球之後有一段不應期 (refractory)，避免同一拍被切成好幾個 window
+
+邏輯和標註工具 GraphWidget._find_next_peak 相同 (門檻 + 500ms 緩衝)，
+只是改成資料一邊進來一邊判斷。沒有揮拍的閒置資料不會觸發任何推論。
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE_HZ = 50
+
+
+class SwingDetector:
+    """
+    threshold: 加速度合力門檻 (與資料同單位，韌體送的是 g)
+    pre / post: 峰值前 / 後要保留幾筆 (預設 30 + 1 + 9 = 40，與標註工具相同)
+    refractory_ms: 偵測到一次擊球後，多久內不再觸發
+    """
+
+    def __init__(self, threshold: float = 3.0, pre: int = 30, post: int = 9,
+                 refractory_ms: float = 500.0, capacity: Optional[int] = None):
+        self.threshold = float(threshold)
+        self.pre = int(pre)
+        self.post = int(post)
+        self.window_size = self.pre + 1 + self.post
+        self.refractory = max(int(round(refractory_ms * SAMPLE_RATE_HZ / 1000.0)), self.post)
+
+        # 環狀緩衝區：容量要比一個 window 大，才能一次塞進一整個 chunk
+        self._capacity = capacity or self.window_size * 4
+        if self._capacity <= self.window_size:
+            raise ValueError("capacity must be larger than the window size")
+        self._samples = np.zeros((self._capacity, 6), dtype=np.float32)
+        self._timestamps = np.zeros(self._capacity, dtype=np.float64)
+        self._count = 0  # 到目前為止總共收到幾筆 (絕對索引)
+
+        # 偵測狀態
+        self._peak_idx = None      # 正在追蹤的峰值 (絕對索引)
+        self._peak_mag = 0.0
+        self._quiet_until = 0      # 不應期結束的絕對索引
+
+    def push(self, samples: np.ndarray, timestamps: np.ndarray) -> List[Tuple[np.ndarray, float]]:
+        """
+        推入一段連續資料
+        samples: (M, 6) float32，timestamps: (M,) 秒
+        回傳這段資料裡確定的擊球：[(window (W, 6), 峰值時間戳記), ...]
+        """
+        results = []
+        # chunk 太大時切小段處理，確保還沒切出的 window 不會被覆寫
+        step = self._capacity - self.window_size
+        for start in range(0, len(samples), step):
+            results.extend(self._push_piece(samples[start:start + step],
+                                            timestamps[start:start + step]))
+        return results
+
+    def _push_piece(self, samples: np.ndarray, timestamps: np.ndarray):
+        first = self._count
+        slots = np.arange(first, first + len(samples)) % self._capacity
+        self._samples[slots] = samples
+        self._timestamps[slots] = timestamps
+        self._count += len(samples)
+
+        # 合力大小，整段一次算完
+        mags = np.sqrt(np.einsum("nk,nk->n", samples[:, :3], samples[:, :3]))
+
+        # 快速路徑：沒有在追蹤峰值、也沒有任何一筆超過門檻 → 閒置資料，直接結束
+        if self._peak_idx is None and not (mags > self.threshold).any():
+            return []
+
+        results = []
+        for offset, mag in enumerate(mags):
+            idx = first + offset
+            if self._peak_idx is None:
+                if mag > self.threshold and idx >= self._quiet_until:
+                    self._peak_idx, self._peak_mag = idx, mag
+            elif mag > self._peak_mag:
+                # 峰值還在往上爬，改追蹤新的最大值
+                self._peak_idx, self._peak_mag = idx, mag
+
+            if self._peak_idx is not None and idx - self._peak_idx >= self.post:
+                window = self._cut(self._peak_idx)
+                if window is not None:
+                    results.append(window)
+                self._quiet_until = self._peak_idx + self.refractory
+                self._peak_idx = None
+        return results
+
+    def _cut(self, peak_idx: int):
+        """從環狀緩衝區切出以 peak_idx 為中心的 window (剛連線時資料不足就放棄)"""
+        start = peak_idx - self.pre
+        if start < 0 or start < self._count - self._capacity:
+            return None
+        slots = np.arange(start, start + self.window_size) % self._capacity
+        return self._samples[slots], float(self._timestamps[peak_idx % self._capacity])
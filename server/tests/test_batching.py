@@ -0,0 +1,115 @@
+"""InferenceBatcher：批次並行送出 (max_in_flight) 與結果分送"""
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from batching import InferenceBatcher  # noqa: E402
+
+
+class GatedModel:
+    """模擬推論 worker：記錄同時在跑幾批，直到 release() 才回傳 (每個 window 的第一個值)"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.batches = []
+        self._gate = asyncio.Event()
+
+    async def __call__(self, windows):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.batches.append(len(windows))
+        await self._gate.wait()
+        self.running -= 1
+        return [float(w[0, 0]) for w in windows]
+
+    def release(self):
+        self._gate.set()
+
+
+def window(value):
+    return np.full((40, 6), value, dtype=np.float32)
+
+
+async def wait_for_batches(model, count):
+    for _ in range(200):
+        if len(model.batches) >= count:
+            return
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.parametrize("max_in_flight, expected_peak", [(1, 1), (2, 2)])
+def test_batches_in_flight(max_in_flight, expected_peak):
+    async def scenario():
+        model = GatedModel()
+        batcher = InferenceBatcher(model, max_batch_size=1, max_wait_ms=0, max_in_flight=max_in_flight)
+        await batcher.start()
+        pending = [asyncio.create_task(batcher.submit(window(i))) for i in range(4)]
+        await wait_for_batches(model, expected_peak)
+        await asyncio.sleep(0.05)  # 給多出來的批次機會開始 (不該開始)
+        peak = model.peak
+        model.release()
+        results = await asyncio.gather(*pending)
+        await batcher.stop()
+        return peak, results
+
+    peak, results = asyncio.run(scenario())
+    assert peak == expected_peak
+    assert results == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_collects_next_batch_while_busy():
+    """worker 都在忙時進來的 window 會湊成下一批，而不是一個一個跑"""
+    async def scenario():
+        model = GatedModel()
+        batcher = InferenceBatcher(model, max_batch_size=8, max_wait_ms=0, max_in_flight=1)
+        await batcher.start()
+        first = asyncio.create_task(batcher.submit(window(0)))
+        await wait_for_batches(model, 1)
+        rest = [asyncio.create_task(batcher.submit(window(i))) for i in range(1, 6)]
+        await asyncio.sleep(0.02)
+        model.release()
+        results = await asyncio.gather(first, *rest)
+        await batcher.stop()
+        return model.batches, results
+
+    batches, results = asyncio.run(scenario())
+    assert batches == [1, 5]
+    assert results == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_stop_cancels_in_flight():
+    async def scenario():
+        model = GatedModel()
+        batcher = InferenceBatcher(model, max_batch_size=1, max_wait_ms=0, max_in_flight=2)
+        await batcher.start()
+        pending = [asyncio.create_task(batcher.submit(window(i))) for i in range(3)]
+        await wait_for_batches(model, 2)
+        await batcher.stop()
+        return await asyncio.gather(*pending, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+
+def test_failure_goes_to_its_own_batch():
+    async def scenario():
+        async def flaky(windows):
+            if windows[0, 0, 0] == 1:
+                raise RuntimeError("boom")
+            return [float(w[0, 0]) for w in windows]
+
+        batcher = InferenceBatcher(flaky, max_batch_size=1, max_wait_ms=0, max_in_flight=2)
+        await batcher.start()
+        results = await asyncio.gather(*[batcher.submit(window(i)) for i in range(3)], return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    ok, failed, ok2 = asyncio.run(scenario())
+    assert (ok, ok2) == (0.0, 2.0)
+    assert isinstance(failed, RuntimeError)
@@ -0,0 +1,60 @@
+"""
+比較 /ws/predict 兩種傳輸格式在伺服器端的解碼成本 (每個 window 的 CPU 時間)
+
+- JSON  : json.loads → IMUFrame (pydantic) → (N, 6) 陣列
+- Binary: np.frombuffer 一次解完 30 bytes * N 的封包
+
+使用方式：
+    python tools/bench_protocol.py --windows 2000 --frames 40
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from simulate_app import generate_dummy_window, encode_window_binary  # noqa: E402
+from protocol import decode_binary_window  # noqa: E402
+from main import decode_json_window  # noqa: E402
+
+
+def bench(label, fn, payloads):
+    # 先跑幾次暖身，避免第一次呼叫的配置成本影響結果
+    for p in payloads[:10]:
+        fn(p)
+
+    start = time.process_time()
+    for p in payloads:
+        fn(p)
+    elapsed = time.process_time() - start
+
+    per_window_us = elapsed / len(payloads) * 1e6
+    print(f"{label:<8} {per_window_us:10.1f} us/window   ({elapsed:.3f}s CPU for {len(payloads)} windows)")
+    return per_window_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=int, default=2000, help="測試的 window 數量")
+    parser.add_argument("--frames", type=int, default=40, help="每個 window 的 frame 數")
+    args = parser.parse_args()
+
+    import simulate_app
+    simulate_app.WINDOW_SIZE = args.frames
+
+    windows = [generate_dummy_window(time.time() + i) for i in range(args.windows)]
+    json_payloads = [json.dumps({"client_id": "bench", "data": w}) for w in windows]
+    binary_payloads = [encode_window_binary(w) for w in windows]
+
+    print(f"== Decode benchmark: {args.windows} windows x {args.frames} frames ==")
+    print(f"payload size: json={len(json_payloads[0])} bytes, binary={len(binary_payloads[0])} bytes")
+
+    t_json = bench("json", lambda p: decode_json_window(json.loads(p)), json_payloads)
+    t_bin = bench("binary", decode_binary_window, binary_payloads)
+    print(f"speedup: {t_json / t_bin:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
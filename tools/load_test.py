@@ -0,0 +1,253 @@
+"""
+壓力測試 (Load Test) — 模擬大量球拍同時連線到 /ws/predict
+
+每個模擬球拍 (client) 是一個 asyncio task：
+連線 → 依指定揮拍頻率送出 generate_dummy_window 的資料 → 等待回應，
+記錄「送出到收到回應」的延遲，最後輸出 p50 / p95 / p99、吞吐量與錯誤數。
+用來在比賽前估算伺服器能撐幾個場地。
+
+使用方式：
+    # 先在另一個終端機啟動伺服器
+    cd server && uvicorn main:app --port 8000
+
+    # 500 支球拍，每支平均每 2 秒揮一次，跑 60 秒
+    python tools/load_test.py --clients 500 --rate 0.5 --duration 60
+
+    # 或讓壓測工具自己啟動本機 uvicorn
+    python tools/load_test.py --spawn-server --clients 200 --binary
+
+連線數上千時，記得先調高檔案描述符上限 (例如 `ulimit -n 65536`)。
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import websockets
+
+from simulate_app import encode_window_binary, generate_dummy_window
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+
+
+class LatencyHistogram:
+    """
+    HDR 風格的延遲直方圖：數值以對數分段 (2 的次方)，
+    每段再細分，所以任何大小的數值相對誤差都固定，記憶體用量也固定，不用存每一筆樣本。
+    sub_buckets 格中實際用到的是後半 (mantissa 在 [sub_buckets/2, sub_buckets))，
+    每格相對寬度 = 2 / sub_buckets (預設 256 格 → 約 0.8%，誤差 < 1%)。
+    單位：微秒 (us)
+    """
+
+    def __init__(self, sub_buckets: int = 256):
+        self.sub_buckets = sub_buckets
+        self.counts = {}
+        self.total = 0
+        self.min = math.inf
+        self.max = 0
+
+    def record(self, value_us: float):
+        value = max(int(value_us), 1)
+        exponent = max(value.bit_length() - int(math.log2(self.sub_buckets)), 0)
+        key = (exponent, value >> exponent)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.total += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """回傳第 p 百分位 (0-100) 的數值 (該格的上界)"""
+        if self.total == 0:
+            return 0.0
+        target = max(1, math.ceil(self.total * p / 100.0))
+        seen = 0
+        for exponent, mantissa in sorted(self.counts):
+            seen += self.counts[(exponent, mantissa)]
+            if seen >= target:
+                return min(((mantissa + 1) << exponent) - 1, self.max)
+        return self.max
+
+
+class Stats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.rejected = 0  # 伺服器回 {"type": "overloaded"} (reject policy)，不算延遲
+        self.timeouts = 0  # 等不到回應 (drop_oldest 丟掉的 window，或太慢)
+        self.late = 0      # 逾時之後才到的舊回應 (直接丟掉)
+        self.connect_errors = 0
+        self.connected = 0
+
+
+def reply_key_ms(window, binary: bool) -> float:
+    """
+    伺服器回應裡的 timestamp 是 window 最後一筆的時間戳記 (秒)，用它對應回應是哪一個 window 的。
+    Binary 送出去的是韌體格式的 uint32 ms，所以用同樣的換算
+    """
+    if binary:
+        return float(int(window[-1]["ts"] * 1000) & 0xFFFFFFFF)
+    return window[-1]["ts"] * 1000.0
+
+
+async def receive_reply(ws, key_ms: float, deadline: float, stats: Stats) -> dict:
+    """等這個 window 的回應；之前逾時的 window 晚到的回應跳過，過了 deadline 丟 TimeoutError"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+        response = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+        timestamp = response.get("timestamp")
+        if timestamp is None:
+            return response  # 錯誤回應沒有 timestamp，是立即回的
+        if abs(float(timestamp) * 1000.0 - key_ms) < 1.0:
+            return response
+        stats.late += 1
+
+
+async def simulated_racket(idx: int, args, stats: Stats, stop_at: float):
+    """一支模擬球拍：連線後持續揮拍，直到 stop_at"""
+    # 錯開連線時間 (ramp-up)，避免所有 client 同一瞬間握手
+    await asyncio.sleep(random.uniform(0, args.ramp_up))
+
+    subprotocols = None
+    if args.binary:
+        from protocol import BINARY_SUBPROTOCOL
+        subprotocols = [BINARY_SUBPROTOCOL]
+
+    client_id = f"load_{idx:05d}"
+    try:
+        async with websockets.connect(args.url, subprotocols=subprotocols, open_timeout=30) as ws:
+            stats.connected += 1
+            while True:
+                # 揮拍間隔：平均 1/rate 秒的指數分布 (Poisson process)
+                await asyncio.sleep(random.expovariate(args.rate))
+                if time.monotonic() >= stop_at:
+                    break
+
+                window = generate_dummy_window(time.time())
+                if args.binary:
+                    message = encode_window_binary(window)
+                else:
+                    message = json.dumps({"client_id": client_id, "data": window})
+
+                started = time.perf_counter()
+                try:
+                    await ws.send(message)
+                    stats.sent += 1
+                    response = await receive_reply(ws, reply_key_ms(window, args.binary),
+                                                   started + args.timeout, stats)
+                except asyncio.TimeoutError:
+                    # drop_oldest 會默默丟掉 window：記下來，球拍繼續揮
+                    stats.timeouts += 1
+                    continue
+                except websockets.ConnectionClosed:
+                    stats.errors += 1
+                    break
+                if response.get("type") == "overloaded":
+                    stats.rejected += 1
+                    continue
+                stats.latency.record((time.perf_counter() - started) * 1e6)
+                stats.received += 1
+                if "error" in response:
+                    stats.errors += 1
+    except (OSError, websockets.InvalidHandshake, asyncio.TimeoutError):
+        stats.connect_errors += 1
+
+
+async def report_progress(stats: Stats, started: float, interval: float):
+    last_received = 0
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.monotonic() - started
+        rate = (stats.received - last_received) / interval
+        last_received = stats.received
+        print(f"[{elapsed:6.1f}s] connected={stats.connected} sent={stats.sent} "
+              f"recv={stats.received} ({rate:.0f}/s) rejected={stats.rejected} "
+              f"timeouts={stats.timeouts} errors={stats.errors} "
+              f"p99={stats.latency.percentile(99) / 1000:.1f}ms")
+
+
+async def run(args):
+    stats = Stats()
+    started = time.monotonic()
+    stop_at = started + args.ramp_up + args.duration
+
+    progress = asyncio.create_task(report_progress(stats, started, args.report_every))
+    await asyncio.gather(*[
+        simulated_racket(i, args, stats, stop_at) for i in range(args.clients)
+    ])
+    progress.cancel()
+
+    # 吞吐量只算 ramp-up 結束後的量測期間
+    measured = max(time.monotonic() - started - args.ramp_up, 1e-9)
+    hist = stats.latency
+    print("\n== Load test result ==")
+    print(f"clients         : {args.clients} (connected {stats.connected}, "
+          f"connect errors {stats.connect_errors})")
+    print(f"windows         : sent {stats.sent}, received {stats.received}, "
+          f"rejected (overloaded) {stats.rejected}, timeouts {stats.timeouts} "
+          f"(late replies {stats.late}), errors {stats.errors}")
+    print(f"throughput      : {stats.received / measured:.1f} windows/s")
+    if hist.total:
+        print(f"latency (ms)    : min {hist.min / 1000:.2f}  p50 {hist.percentile(50) / 1000:.2f}  "
+              f"p95 {hist.percentile(95) / 1000:.2f}  p99 {hist.percentile(99) / 1000:.2f}  "
+              f"max {hist.max / 1000:.2f}")
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """在 server/ 目錄啟動本機 uvicorn，等它開始接受連線"""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000/ws/predict", help="WebSocket URL")
+    parser.add_argument("--clients", type=int, default=100, help="同時連線的模擬球拍數")
+    parser.add_argument("--rate", type=float, default=0.33, help="每支球拍每秒平均揮拍次數")
+    parser.add_argument("--duration", type=float, default=30, help="量測時間 (秒，不含 ramp-up)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="在幾秒內把所有 client 連上")
+    parser.add_argument("--timeout", type=float, default=10, help="等待單一回應的逾時 (秒)")
+    parser.add_argument("--binary", action="store_true", help="使用 30 bytes binary 格式傳送")
+    parser.add_argument("--report-every", type=float, default=5, help="進度輸出間隔 (秒)")
+    parser.add_argument("--spawn-server", action="store_true", help="自動啟動本機 uvicorn (server/main.py)")
+    parser.add_argument("--port", type=int, default=8000, help="--spawn-server 使用的連接埠")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_server:
+        server = spawn_server(args.port)
+        args.url = f"ws://127.0.0.1:{args.port}/ws/predict"
+
+    print(f"== Load test: {args.clients} clients x {args.rate} swings/s against {args.url} ==")
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
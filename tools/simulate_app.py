@@ -5,13 +5,19 @@ import time
 import random
 import math
 import argparse
+import os
+import sys
 # import pandas as pd # 如果要讀 Excel
 
+# 讓模擬器可以共用 server/protocol.py 的 binary 編碼
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
 # --- 設定 ---
 # SERVER_URL = "ws://localhost:8000/ws/predict"
 SERVER_URL = "wss://diid-termproject-v2.onrender.com/ws/predict"
 WINDOW_SIZE = 40  # 模擬每次傳送 40 frames
 SAMPLE_RATE = 50  # 50 Hz
+STREAM_CHUNK = 5  # 串流模式：每次送 5 筆 (100ms)
 
 # --- 產生假資料 (Dummy Data Generator) ---
 def generate_dummy_window(start_time):
@@ -48,10 +54,61 @@ def generate_dummy_window(start_time):
     
     return frames
 
-async def simulate_app():
-    print(f"Connecting to {SERVER_URL}...")
+def generate_stream_frames(start_time):
+    """
+    串流模式用：無限產生連續的 50Hz 資料 (單位 g，和韌體一樣)
+    平常是靜止 (重力在 Z 軸)，每隔 2-4 秒插入一次揮拍 (峰值約 5-10g)
+    """
+    t = start_time
+    while True:
+        # 閒置一段時間
+        for _ in range(int(random.uniform(2, 4) * SAMPLE_RATE)):
+            yield {
+                "ts": t,
+                "acc": [random.gauss(0, 0.05), random.gauss(0, 0.05), 1.0 + random.gauss(0, 0.05)],
+                "gyro": [random.gauss(0, 2), random.gauss(0, 2), random.gauss(0, 2)],
+            }
+            t += 1.0 / SAMPLE_RATE
+
+        # 揮拍：20 筆 (0.4 秒) 的 sin 波
+        peak = random.uniform(5, 10)
+        for i in range(20):
+            wave = math.sin(i / 20 * math.pi)
+            yield {
+                "ts": t,
+                "acc": [wave * peak * 0.5, wave * peak, 1.0 + random.gauss(0, 0.1)],
+                "gyro": [wave * 1500, random.gauss(0, 50), random.gauss(0, 50)],
+            }
+            t += 1.0 / SAMPLE_RATE
+
+def print_response(response):
+    if "error" in response:
+        print(f"   Server error: {response['error']}")
+    elif response.get("type") == "hello":
+        print(f"   Server switched to {response['mode']} mode")
+    elif response["display"]:
+        print(f"\n>>> UI UPDATE REQUIRED! <<<")
+        print(f"   TYPE: {response['type']}")
+        print(f"   SPEED: {response['speed']} km/h")
+        print(f"   MSG: {response['message']}\n")
+    else:
+        print(f"   Result: {response['type']} (Hidden)")
+
+def encode_window_binary(window_data):
+    """把 generate_dummy_window 的結果轉成韌體的 30 bytes 封包格式"""
+    from protocol import encode_binary_window
+    window = [f["acc"] + f["gyro"] for f in window_data]
+    ts_ms = [int(f["ts"] * 1000) & 0xFFFFFFFF for f in window_data]
+    return encode_binary_window(window, ts_ms)
+
+async def simulate_app(server_url=SERVER_URL, binary=False):
+    print(f"Connecting to {server_url} (binary={binary})...")
     try:
-        async with websockets.connect(SERVER_URL) as websocket:
+        subprotocols = None
+        if binary:
+            from protocol import BINARY_SUBPROTOCOL
+            subprotocols = [BINARY_SUBPROTOCOL]
+        async with websockets.connect(server_url, subprotocols=subprotocols) as websocket:
             print("Connected! Start sending data (Press Ctrl+C to stop)...")
             
             sequence = 0
@@ -68,20 +125,17 @@ async def simulate_app():
                 # 2. 發送 Request
                 # 模擬真實情況：動作發生後才會發送，所以我們每隔幾秒發送一次
                 print(f"[{sequence}] Sending {len(window_data)} frames...")
-                await websocket.send(json.dumps(payload))
+                if binary:
+                    await websocket.send(encode_window_binary(window_data))
+                else:
+                    await websocket.send(json.dumps(payload))
                 
                 # 3. 等待回應
                 response_txt = await websocket.recv()
                 response = json.loads(response_txt)
                 
                 # 4. 顯示結果
-                if response["display"]:
-                    print(f"\n>>> UI UPDATE REQUIRED! <<<")
-                    print(f"   TYPE: {response['type']}")
-                    print(f"   SPEED: {response['speed']} km/h")
-                    print(f"   MSG: {response['message']}\n")
-                else:
-                    print(f"   Result: {response['type']} (Hidden)")
+                print_response(response)
                 
                 sequence += 1
                 
@@ -95,11 +149,53 @@ async def simulate_app():
     except Exception as e:
         print(f"Error: {e}")
 
+async def simulate_stream(server_url=SERVER_URL, binary=False):
+    """
+    串流模式：不切 window，持續送小段資料，由伺服器偵測揮拍
+    伺服器只在偵測到擊球時回傳，所以收與送分成兩個 task
+    """
+    from protocol import STREAM_SUBPROTOCOL
+    print(f"Connecting to {server_url} (stream, binary={binary})...")
+    try:
+        async with websockets.connect(server_url, subprotocols=[STREAM_SUBPROTOCOL]) as websocket:
+            print("Connected! Streaming data (Press Ctrl+C to stop)...")
+
+            async def receiver():
+                async for response_txt in websocket:
+                    print_response(json.loads(response_txt))
+
+            receive_task = asyncio.create_task(receiver())
+            frames = generate_stream_frames(time.time())
+            try:
+                while True:
+                    chunk = [next(frames) for _ in range(STREAM_CHUNK)]
+                    if binary:
+                        await websocket.send(encode_window_binary(chunk))
+                    else:
+                        await websocket.send(json.dumps({"client_id": "simulated_device_001", "data": chunk}))
+                    await asyncio.sleep(STREAM_CHUNK / SAMPLE_RATE)
+            finally:
+                receive_task.cancel()
+
+    except ConnectionRefusedError:
+        print("Error: Could not connect to server. Make sure 'server/main.py' is running.")
+    except Exception as e:
+        print(f"Error: {e}")
+
 if __name__ == "__main__":
     try:
         # Check if we should install dependencies first? 
         # No, leave that to user.
+        parser = argparse.ArgumentParser(description="Badminton App Simulator")
+        parser.add_argument("--url", default=SERVER_URL, help="WebSocket URL")
+        parser.add_argument("--binary", action="store_true", help="使用 30 bytes binary 格式傳送")
+        parser.add_argument("--stream", action="store_true", help="串流模式：連續送資料，由伺服器偵測揮拍")
+        args = parser.parse_args()
+
         print("== Badminton App Simulator ==")
-        asyncio.run(simulate_app())
+        if args.stream:
+            asyncio.run(simulate_stream(args.url, args.binary))
+        else:
+            asyncio.run(simulate_app(args.url, args.binary))
     except KeyboardInterrupt:
         print("\nStopped.")